@@ -0,0 +1,160 @@
+# archive.py
+
+import os
+import json
+import zlib
+import threading
+from collections import OrderedDict
+
+# Name the archive database is attached under on every pooled connection
+SCHEMA = "archive"
+
+
+class SessionArchive:
+    """
+    Compressed cold storage for the turns of ended sessions.
+
+    Turns moved out of the hot context table are kept in a separate SQLite
+    file, attached to the storage connections as SCHEMA. Each move adds a
+    chunk: one zlib-compressed JSON array of (id, role, content, timestamp)
+    rows of one session. Chunks are only inflated when their session is
+    read or searched, and the last cache_size sessions read stay inflated.
+    """
+
+    def __init__(self, storage, path, level=6, cache_size=8):
+        self.storage = storage
+        self.path = path
+        self.level = level
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def setup(self):
+        """Create the chunk table in the attached database."""
+        with self.storage.writer() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SCHEMA}.chunks (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    messages INTEGER NOT NULL,
+                    raw_bytes INTEGER NOT NULL,
+                    stored_bytes INTEGER NOT NULL,
+                    first_time DATETIME,
+                    last_time DATETIME,
+                    archived DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    data BLOB NOT NULL
+                )
+            """)
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS {SCHEMA}.chunks_session
+                ON chunks (session_id, first_time)
+            """)
+
+    def add(self, conn, session_id, rows):
+        """
+        Store (id, role, content, timestamp) rows of a session as one chunk.
+
+        Runs on conn so the caller decides the transaction. Returns the
+        uncompressed and compressed sizes in bytes.
+        """
+        raw = json.dumps([list(row) for row in rows], ensure_ascii=False).encode("utf-8")
+        data = zlib.compress(raw, self.level)
+        conn.execute(f"""
+            INSERT INTO {SCHEMA}.chunks
+                (session_id, messages, raw_bytes, stored_bytes, first_time, last_time, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (session_id, len(rows), len(raw), len(data), rows[0][3], rows[-1][3], data))
+        with self._lock:
+            self._cache.pop(session_id, None)
+        return len(raw), len(data)
+
+    def messages(self, session_id):
+        """A session's archived messages in order, inflating its chunks on first read."""
+        with self._lock:
+            if session_id in self._cache:
+                self._cache.move_to_end(session_id)
+                return self._cache[session_id]
+
+        rows = self.storage.query(f"""
+            SELECT data FROM {SCHEMA}.chunks
+            WHERE session_id = ?
+            ORDER BY first_time, id
+        """, (session_id,))
+        messages = []
+        seen = set()
+        for (data,) in rows:
+            for _id, role, content, timestamp in json.loads(zlib.decompress(data)):
+                # A move interrupted before its delete archives a row twice
+                if _id in seen:
+                    continue
+                seen.add(_id)
+                messages.append({"id": _id, "role": role, "content": content,
+                                 "timestamp": timestamp})
+
+        with self._lock:
+            self._cache[session_id] = messages
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return messages
+
+    def sessions(self, limit=20, offset=0):
+        """Archived sessions, most recent first, with their sizes."""
+        rows = self.storage.query(f"""
+            SELECT session_id, SUM(messages), SUM(raw_bytes), SUM(stored_bytes),
+                   MIN(first_time), MAX(last_time)
+            FROM {SCHEMA}.chunks
+            GROUP BY session_id
+            ORDER BY MAX(last_time) DESC
+            LIMIT ? OFFSET ?
+        """, (limit, offset))
+        return [{"session_id": session_id, "messages": messages, "raw_bytes": raw,
+                 "stored_bytes": stored, "first_time": first, "last_time": last}
+                for session_id, messages, raw, stored, first, last in rows]
+
+    def search(self, keyword, limit=20):
+        """
+        Archived messages containing keyword, newest sessions first.
+
+        Sessions are inflated one at a time until limit matches are found,
+        so the cost grows with how far back the matches are.
+        """
+        needle = keyword.casefold()
+        matches = []
+        offset = 0
+        while len(matches) < limit:
+            page = self.sessions(limit=50, offset=offset)
+            if not page:
+                break
+            for session in page:
+                for msg in self.messages(session["session_id"]):
+                    if needle in msg["content"].casefold():
+                        matches.append(dict(msg, session_id=session["session_id"]))
+                        if len(matches) >= limit:
+                            return matches
+            offset += len(page)
+        return matches
+
+    def clear(self, conn):
+        """Drop every archived chunk on conn."""
+        conn.execute(f"DELETE FROM {SCHEMA}.chunks")
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """Archived sessions and messages, their raw and stored sizes, and the file size."""
+        sessions, chunks, messages, raw, stored = self.storage.query_one(f"""
+            SELECT COUNT(DISTINCT session_id), COUNT(*), COALESCE(SUM(messages), 0),
+                   COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(stored_bytes), 0)
+            FROM {SCHEMA}.chunks
+        """)
+        file_bytes = sum(os.path.getsize(path) for path in (self.path, f"{self.path}-wal")
+                         if os.path.exists(path))
+        return {
+            "sessions": sessions,
+            "chunks": chunks,
+            "messages": messages,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "saved_bytes": raw - stored,
+            "file_bytes": file_bytes,
+        }
@@ -0,0 +1,133 @@
+# batch.py
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import logic
+from logic import console
+
+
+def read_items(path):
+    """
+    Parse the batch input: one JSON object per line.
+
+    Each item has a "prompt" string or a "prompts" list (turns of one
+    conversation) and an optional "id"; items without one are keyed by line
+    number. Blank lines are skipped.
+    """
+    items = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON: {e}") from None
+            if isinstance(item, str):
+                item = {"prompt": item}
+            prompts = item.get("prompts") or [item.get("prompt")]
+            if not all(isinstance(p, str) and p.strip() for p in prompts):
+                raise ValueError(f"{path}:{number}: expected a \"prompt\" string or a \"prompts\" list")
+            item_id = str(item.get("id", number))
+            if item_id in seen:
+                raise ValueError(f"{path}:{number}: duplicate id {item_id!r}")
+            seen.add(item_id)
+            items.append((item_id, prompts))
+    return items
+
+
+def load_checkpoint(path):
+    """
+    Ids already answered in an earlier run's output.
+
+    A torn last line left by a crash is cut off; items whose latest record
+    is an error are not counted, so they run again.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    latest = {}
+    good_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            latest[record["id"]] = record.get("error") is None
+
+    if good_end != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_end)
+    return {item_id for item_id, ok in latest.items() if ok}
+
+
+def run_item(item_id, prompts):
+    """Answer one item's prompts in a fresh session and build its output record."""
+    start = time.perf_counter()
+    session_id = logic.start_session()
+    responses = []
+    error = None
+    try:
+        for prompt in prompts:
+            responses.append(logic.answer(prompt, session_id))
+    except Exception as e:
+        error = str(e)
+    finally:
+        logic.end_session(session_id)
+    return {
+        "id": item_id,
+        "session_id": session_id,
+        "prompts": prompts,
+        "responses": responses,
+        "error": error,
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_batch(input_path, output_path, workers=4):
+    """
+    Answer every prompt in input_path, appending results to output_path.
+
+    Items run concurrently, each in its own session, and each result is
+    written as soon as it completes. Items already answered in output_path
+    are skipped, so an interrupted run resumes where it stopped. Returns
+    (answered, failed, skipped) counts.
+    """
+    items = read_items(input_path)
+    done = load_checkpoint(output_path)
+    pending = [(item_id, prompts) for item_id, prompts in items if item_id not in done]
+    skipped = len(items) - len(pending)
+    if skipped:
+        console.print(f"[yellow]Resuming: {skipped} of {len(items)} items already answered.[/yellow]")
+
+    answered = failed = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+            futures = [pool.submit(run_item, item_id, prompts) for item_id, prompts in pending]
+            try:
+                for future in as_completed(futures):
+                    record = future.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    if record["error"] is None:
+                        answered += 1
+                    else:
+                        failed += 1
+                        console.print(f"[red]Item {record['id']} failed: {record['error']}[/red]")
+            except KeyboardInterrupt:
+                # Finish nothing new; answered items are already checkpointed
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                os.fsync(out.fileno())
+
+    return answered, failed, skipped
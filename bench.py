@@ -0,0 +1,770 @@
+# bench.py
+"""Micro-benchmarks for the MCP chat storage and pipeline.
+
+Run a single benchmark with `python bench.py <name>`; `python bench.py --help`
+lists the available ones. Every benchmark works in a throwaway directory and
+never touches the real context.db or context.json.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+
+@contextmanager
+def scratch_dir():
+    """Run the body inside a temporary working directory."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+def seed_history(path, rows):
+    """Fill the context table with rows alternating user/assistant messages."""
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO context (id, role, content, is_fact) VALUES (?, ?, ?, ?)",
+            (
+                (str(uuid.uuid4()), "user" if i % 2 == 0 else "assistant",
+                 f"Message {i} about sorting algorithms and data structures.", i % 5 == 0)
+                for i in range(rows)
+            ),
+        )
+
+
+def report(name, samples):
+    """Print median and p95 of a list of timings in seconds."""
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<28} median {statistics.median(samples) * 1000:8.3f} ms   "
+          f"p95 {p95 * 1000:8.3f} ms")
+
+
+def _legacy_turn(path):
+    """One chat turn the way logic.py did it: a fresh connection per call."""
+    timings = {}
+    for step, role in (("write", "user"), ("read", None), ("write", "assistant")):
+        start = time.perf_counter()
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        if role is None:
+            cursor.execute("SELECT id, role, content, is_fact FROM context ORDER BY timestamp")
+            cursor.fetchall()
+        else:
+            cursor.execute(
+                "INSERT INTO context (id, role, content, is_fact) VALUES (?, ?, ?, ?)",
+                (str(uuid.uuid4()), role, "benchmark turn", False),
+            )
+            conn.commit()
+        conn.close()
+        timings[step] = timings.get(step, 0) + time.perf_counter() - start
+    return timings
+
+
+def _pooled_turn(storage):
+    """One chat turn on the shared storage pool."""
+    timings = {}
+    for step, role in (("write", "user"), ("read", None), ("write", "assistant")):
+        start = time.perf_counter()
+        if role is None:
+            storage.query("SELECT id, role, content, is_fact FROM context ORDER BY timestamp")
+        else:
+            storage.execute(
+                "INSERT INTO context (id, role, content, is_fact) VALUES (?, ?, ?, ?)",
+                (str(uuid.uuid4()), role, "benchmark turn", False),
+            )
+        timings[step] = timings.get(step, 0) + time.perf_counter() - start
+    return timings
+
+
+def _time_turns(label, turn, turns):
+    """Report total, write and read time of repeated chat turns."""
+    samples = [turn() for _ in range(turns)]
+    report(f"{label} turn", [t["write"] + t["read"] for t in samples])
+    report(f"{label} writes", [t["write"] for t in samples])
+    report(f"{label} history read", [t["read"] for t in samples])
+
+
+def bench_storage(args):
+    """Per-turn DB overhead: connection-per-call versus the storage pool."""
+    from setup_db import setup_database
+    from storage import Storage
+
+    with scratch_dir():
+        setup_database()
+        seed_history("context.db", args.rows)
+        print(f"history: {args.rows} rows, {args.turns} turns")
+
+        _time_turns("legacy", lambda: _legacy_turn("context.db"), args.turns)
+
+        storage = Storage("context.db")
+        _time_turns("pooled", lambda: _pooled_turn(storage), args.turns)
+        storage.close()
+
+
+def _legacy_json_append(path, entry):
+    """Append one message the way add_message did: rewrite the whole file."""
+    with open(path, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    messages.append(entry)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(messages, f, indent=2)
+
+
+def bench_journal(args):
+    """Per-message persistence cost: full context.json rewrite versus the journal."""
+    from journal import Journal
+    from shards import ShardStore
+
+    with scratch_dir():
+        for size in (args.rows // 10, args.rows):
+            history = [{"id": str(uuid.uuid4()), "role": "user", "content": f"Message {i}"}
+                       for i in range(size)]
+            with open("context.json", "w", encoding="utf-8") as f:
+                json.dump(history, f, indent=2)
+
+            samples = []
+            for i in range(args.turns):
+                start = time.perf_counter()
+                _legacy_json_append("context.json", {"id": str(i), "role": "user", "content": "new"})
+                samples.append(time.perf_counter() - start)
+            report(f"rewrite ({size} msgs)", samples)
+
+            journal = Journal("context.jsonl", ShardStore("memory"), compact_every=args.turns + 1)
+            samples = []
+            for i in range(args.turns):
+                start = time.perf_counter()
+                journal.append({"id": str(i), "role": "user", "content": "new"})
+                samples.append(time.perf_counter() - start)
+            journal.close()
+            os.remove("context.jsonl")
+            report(f"journal ({size} msgs)", samples)
+
+
+def _legacy_is_fact_response(response: str) -> bool:
+    """is_fact_response as it was before the compiled matcher, kept as the reference."""
+    # Keywords that indicate factual information
+    fact_keywords = [
+        # Technical facts
+        " is ", " are ", " was ", " were ", " means ", " stands for ", " used to ",
+        " include ", " such as ", " examples ", " definition ", " important ",
+        " consists of ", " helps ", " allows ", " can be ", " typically ",
+        " commonly ", " usually ", " consists ", " refers to ", " characteristics ",
+        " types ", " consist of ", " based on ", " requires ", " needs ",
+        " must ", " should ", " will ", " has ", " have ", " had ",
+        # Technical relationships
+        " connects ", " integrates ", " interacts ", " communicates ",
+        " depends on ", " relies on ", " uses ", " implements ",
+        # Technical properties
+        " property ", " attribute ", " feature ", " capability ",
+        " functionality ", " behavior ", " structure ", " architecture ",
+        # Technical actions
+        " performs ", " executes ", " processes ", " handles ",
+        " manages ", " controls ", " operates ", " functions ",
+        # Technical states
+        " state ", " status ", " condition ", " mode ",
+        " configuration ", " setting ", " parameter ",
+        # General facts
+        " because ", " since ", " as ", " due to ", " therefore ", " thus ",
+        " in fact ", " actually ", " indeed ", " specifically ", " particularly ",
+        " especially ", " notably ", " importantly ", " significantly ",
+        " primarily ", " mainly ", " mostly ", " largely ", " generally ",
+        " typically ", " usually ", " commonly ", " frequently ", " often ",
+        " always ", " never ", " sometimes ", " occasionally ", " rarely "
+    ]
+    
+    response_lower = response.lower()
+    
+    # Check for fact keywords
+    has_fact_keywords = any(keyword in response_lower for keyword in fact_keywords)
+    
+    # Check for technical terms
+    technical_terms = ["api", "database", "server", "client", "protocol", "interface",
+                      "function", "method", "class", "object", "variable", "constant",
+                      "module", "package", "library", "framework", "architecture",
+                      "system", "application", "service", "component", "feature",
+                      "movie", "film", "character", "plot", "story", "director",
+                      "actor", "actress", "scene", "sequence", "theme", "genre",
+                      "cinema", "cinematic", "visual", "special effects", "soundtrack",
+                      "score", "editing", "cinematography", "production", "director",
+                      "writer", "screenplay", "script", "dialogue", "monologue",
+                      "performance", "acting", "role", "character", "protagonist",
+                      "antagonist", "supporting", "cast", "crew", "production",
+                      "budget", "box office", "revenue", "release", "premiere",
+                      "theater", "cinema", "audience", "review", "critic",
+                      "rating", "award", "nomination", "academy", "oscar",
+                      "golden globe", "bafta", "cannes", "venice", "berlin",
+                      "sundance", "tribeca", "independent", "studio", "production",
+                      "company", "distributor", "marketing", "promotion", "trailer",
+                      "teaser", "poster", "artwork", "design", "concept",
+                      "development", "pre-production", "production", "post-production",
+                      "editing", "sound", "music", "visual effects", "special effects",
+                      "stunts", "action", "drama", "comedy", "thriller", "horror",
+                      "sci-fi", "fantasy", "romance", "documentary", "animation",
+                      "live action", "3D", "IMAX", "format", "resolution",
+                      "aspect ratio", "soundtrack", "score", "song", "music",
+                      "sound design", "mixing", "editing", "color", "grading",
+                      "visual effects", "special effects", "stunts", "action",
+                      "drama", "comedy", "thriller", "horror", "sci-fi", "fantasy",
+                      "romance", "documentary", "animation", "live action", "3D",
+                      "IMAX", "format", "resolution", "aspect ratio", "soundtrack",
+                      "score", "song", "music", "sound design", "mixing", "editing",
+                      "color", "grading", "visual effects", "special effects",
+                      "stunts", "action", "drama", "comedy", "thriller", "horror",
+                      "sci-fi", "fantasy", "romance", "documentary", "animation",
+                      "live action", "3D", "IMAX", "format", "resolution",
+                      "aspect ratio", "soundtrack", "score", "song", "music",
+                      "sound design", "mixing", "editing", "color", "grading"]
+    has_technical_terms = any(term in response_lower for term in technical_terms)
+    
+    # A response is considered factual if it contains fact keywords or technical terms
+    # AND is not too long (to avoid storing full conversations)
+    is_concise = len(response.split()) <= 100  # Increased word limit
+    
+    return (has_fact_keywords or has_technical_terms) and is_concise
+
+
+def _load_corpus(rows):
+    """Message contents from context.json, repeated and padded to rows entries."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "context.json")
+    with open(path, "r", encoding="utf-8") as f:
+        contents = [m["content"] for m in json.load(f)]
+    # Add long and keyword-free messages so both exits are exercised
+    contents.append("word " * 150)
+    contents.append("okay thanks, sounds good to me")
+    return [contents[i % len(contents)] for i in range(rows)]
+
+
+def bench_classifier(args):
+    """Fact classification: per-keyword substring scans versus the compiled matcher."""
+    from logic import is_fact_response, classify_facts
+
+    corpus = _load_corpus(args.rows)
+    expected = [_legacy_is_fact_response(text) for text in corpus]
+    assert [is_fact_response(text) for text in corpus] == expected, "is_fact_response differs"
+    assert classify_facts(corpus) == expected, "classify_facts differs"
+    print(f"{len(corpus)} messages, {sum(expected)} facts, outputs identical")
+
+    for name, run in (
+        ("legacy", lambda: [_legacy_is_fact_response(text) for text in corpus]),
+        ("is_fact_response", lambda: [is_fact_response(text) for text in corpus]),
+        ("classify_facts", lambda: classify_facts(corpus)),
+    ):
+        samples = []
+        for _ in range(args.turns):
+            start = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+
+def _legacy_extract_context(user_input: str, ai_response: str) -> str:
+    """extract_context as it was before ContextExtractor, kept as the reference."""
+    # Combine user input and AI response for analysis
+    combined = f"{user_input} {ai_response}".lower()
+    
+    # Define context categories with their patterns
+    context_patterns = {
+        "Technical Fact": [
+            # Technical definitions
+            r"(?:it|this|that|they|he|she)\s+(?:is|are|was|were|means|refers to)\s+(?:a|an|the)?\s*([^.!?]+(?:system|architecture|framework|technology|method|process)[^.!?]+[.!?])",
+            # Technical characteristics
+            r"(?:the|a|an)\s+([^.!?]+(?:is|are|was|were)\s+(?:used for|designed to|implemented as|configured to)[^.!?]+[.!?])",
+            # Technical relationships
+            r"(?:it|this|that|they|he|she)\s+(?:connects|integrates|interacts|communicates)\s+(?:with|to|through)\s+([^.!?]+[.!?])"
+        ],
+        "Project Context": [
+            # Project structure
+            r"(?:the|this|that)\s+(?:project|system|application)\s+(?:has|contains|includes|consists of)\s+([^.!?]+[.!?])",
+            # Project requirements
+            r"(?:we|they|he|she)\s+(?:need|require|must have)\s+([^.!?]+[.!?])",
+            # Project constraints
+            r"(?:the|this|that)\s+(?:project|system|application)\s+(?:must|should|needs to)\s+([^.!?]+[.!?])"
+        ]
+    }
+    
+    # Try each pattern type
+    for context_type, patterns in context_patterns.items():
+        for pattern in patterns:
+            matches = re.finditer(pattern, combined)
+            for match in matches:
+                context = match.group(1).strip()
+                # Validate context quality
+                if _legacy_is_valid_context(context):
+                    return f"{context_type}: {context}"
+    
+    return None
+
+def _legacy_is_valid_context(context: str) -> bool:
+    """Validate if the extracted context is meaningful and complete."""
+    # Check minimum length (at least 3 words)
+    if len(context.split()) < 3:
+        return False
+    
+    # Check for proper sentence ending
+    if not context.endswith(('.', '!', '?')):
+        return False
+    
+    # Check for common meaningless patterns
+    meaningless_patterns = [
+        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s+(?:a|an|the)\s*$",
+        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s*$",
+        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:have|has|had)\s*$",
+        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:want|need|like|love)\s*$"
+    ]
+    
+    for pattern in meaningless_patterns:
+        if re.match(pattern, context, re.IGNORECASE):
+            return False
+    
+    # Check for minimum information content
+    # Count significant words (excluding common words)
+    common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
+    words = set(context.lower().split())
+    significant_words = words - common_words
+    
+    if len(significant_words) < 2:
+        return False
+    
+    return True
+
+
+def bench_extractor(args):
+    """Context extraction: per-call pattern compilation versus ContextExtractor."""
+    from extractor import ContextExtractor
+
+    texts = _load_corpus(args.rows)
+    texts += [
+        "The project has a queue, a worker pool and a cache for replies.",
+        "It integrates with the storage layer through a single writer.",
+        "This is a system for indexing messages by content hash.",
+    ]
+    turns = [(texts[i], texts[-1 - i]) for i in range(len(texts))]
+    extractor = ContextExtractor()
+
+    expected = [_legacy_extract_context(u, a) for u, a in turns]
+    assert list(extractor.extract_many(turns)) == expected, "extract_many differs"
+    print(f"{len(turns)} turns, {sum(e is not None for e in expected)} contexts, outputs identical")
+
+    for name, run in (
+        ("legacy", lambda: [_legacy_extract_context(u, a) for u, a in turns]),
+        ("extract_many", lambda: list(extractor.extract_many(turns))),
+    ):
+        samples = []
+        for _ in range(args.turns):
+            start = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+
+def _write_snapshot_file(path, count):
+    """Write a context.json-style snapshot with count messages."""
+    messages = [
+        {"id": str(uuid.uuid4()), "role": "user" if i % 2 == 0 else "assistant",
+         "content": f"Message {i}: the heap keeps its smallest key at the root."}
+        for i in range(count)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(messages, f, indent=2)
+    return messages
+
+
+def _legacy_import(messages, json_path):
+    """Startup import the way pull_json_from_github did it: one add_message per row."""
+    for fact in messages:
+        conn = sqlite3.connect("context.db")
+        conn.execute(
+            "INSERT INTO context (id, role, content, is_fact) VALUES (?, ?, ?, ?)",
+            (str(uuid.uuid4()), fact["role"], fact["content"], True),
+        )
+        with open(json_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        existing.append({"id": fact["id"], "role": fact["role"], "content": fact["content"]})
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(existing, f, indent=2)
+        conn.commit()
+        conn.close()
+
+
+def bench_startup(args):
+    """Time to first prompt: init_db importing a large context.json snapshot."""
+    import logic
+    from setup_db import setup_database
+
+    with scratch_dir():
+        # The legacy path is quadratic, so it only runs on a small snapshot
+        legacy_rows = min(args.rows, 500)
+        setup_database()
+        messages = _write_snapshot_file("context.json", legacy_rows)
+        start = time.perf_counter()
+        _legacy_import(messages, "context.json")
+        print(f"legacy import ({legacy_rows} msgs)   {time.perf_counter() - start:8.3f} s")
+
+    for label in ("cold", "warm"):
+        with scratch_dir():
+            _write_snapshot_file("context.json", args.rows)
+            if label == "warm":
+                # Second start: database, index and facts already exist
+                logic.init_db()
+                logic.shutdown()
+            start = time.perf_counter()
+            logic.init_db()
+            logic.flush_writes()
+            elapsed = time.perf_counter() - start
+            logic.shutdown()
+            print(f"init_db {label} ({args.rows} msgs)   {elapsed:8.3f} s to first prompt")
+
+
+class FakeAPIError(Exception):
+    """Stand-in for a Groq status error, carrying the response headers."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeGroqClient:
+    """Offline chat client that injects latency and 429s at a fixed rate."""
+
+    def __init__(self, latency=0.02, error_rate=0.3, retry_after=0.05, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            throttled = self._random.random() < self.error_rate
+        time.sleep(self.latency)
+        if throttled:
+            raise FakeAPIError(429, self.retry_after)
+        message = SimpleNamespace(content="ok")
+        usage = SimpleNamespace(total_tokens=kwargs.get("max_tokens", 0) // 2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def bench_retention(args):
+    """Per-turn fact bookkeeping at capacity: rescoring every fact versus the importance heap."""
+    from retention import ImportanceHeap
+
+    rng = random.Random(0)
+    now = time.time()
+    facts = [(f"f{i}", rng.randint(40, 400), rng.choice((0.3, 0.6, 1.0)), now - rng.uniform(0, 90 * 86400))
+             for i in range(args.rows)]
+    decay = math.log(2) / (14 * 86400)
+
+    # Reference: every fact's decayed score recomputed to find the one to drop
+    naive = {key: [1.0, last, confidence] for key, _, confidence, last in facts}
+
+    def naive_turn(i):
+        t = now + i
+        for key in rng.sample(list(naive), 8):
+            entry = naive[key]
+            entry[0] = entry[0] * math.exp(-decay * (t - entry[1])) + 1.0
+            entry[1] = t
+        naive[f"n{i}"] = [1.0, t, 1.0]
+        victim = min(naive, key=lambda k: naive[k][2] * naive[k][0] * math.exp(-decay * (t - naive[k][1])))
+        del naive[victim]
+
+    heap = ImportanceHeap(max_count=args.rows)
+    for key, size, confidence, last in facts:
+        heap.add(key, size, confidence, last=last)
+    keys = [key for key, _, _, _ in facts]
+
+    def heap_turn(i):
+        t = now + i
+        heap.touch(rng.sample(keys, 8), t)
+        heap.add(f"n{i}", 100, 1.0, last=t)
+        heap.evict()
+
+    for name, turn in (("rescore all", naive_turn), ("importance heap", heap_turn)):
+        samples = []
+        for i in range(args.turns):
+            start = time.perf_counter()
+            turn(i)
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+    print(f"{args.rows} facts at capacity, {heap.evicted} evicted by the heap")
+
+
+def bench_archive(args):
+    """Hot-table scans with ended sessions kept inline versus moved to the compressed archive."""
+    from setup_db import setup_database
+    from storage import Storage
+    from archive import SessionArchive, SCHEMA
+
+    per_session = 40
+    with scratch_dir():
+        setup_database()
+        sessions = [str(uuid.uuid4()) for _ in range(max(args.rows // per_session, 2))]
+        with sqlite3.connect("context.db") as conn:
+            conn.executemany(
+                "INSERT INTO sessions (id, start_time, end_time) VALUES (?, CURRENT_TIMESTAMP, ?)",
+                ((session_id, None if i == len(sessions) - 1 else "2024-01-01 00:00:00")
+                 for i, session_id in enumerate(sessions)))
+            conn.executemany(
+                "INSERT INTO context (id, session_id, role, content, is_fact, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                ((str(uuid.uuid4()), sessions[i // per_session], "user" if i % 2 == 0 else "assistant",
+                  f"Message {i} about sorting algorithms and data structures, and why quicksort "
+                  f"degrades on already sorted input.", int(i % 5 == 0), f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000:03d}")
+                 for i in range(args.rows)))
+
+        storage = Storage("context.db", attach={SCHEMA: "context.archive.db"})
+        archive = SessionArchive(storage, "context.archive.db")
+        archive.setup()
+
+        def scans():
+            samples = []
+            for _ in range(args.turns):
+                start = time.perf_counter()
+                storage.query("SELECT id, role, content, is_fact FROM context WHERE is_fact = 1 ORDER BY timestamp")
+                storage.query("SELECT id, role, content, is_fact FROM context WHERE is_fact = 0 ORDER BY timestamp")
+                samples.append(time.perf_counter() - start)
+            return samples
+
+        print(f"{args.rows} messages in {len(sessions)} sessions, all but one ended")
+        report("inline (facts + history)", scans())
+
+        # What archive_session does for each ended session
+        for session_id in sessions[:-1]:
+            rows = storage.query(
+                "SELECT id, role, content, timestamp FROM context "
+                "WHERE is_fact = 0 AND session_id = ? ORDER BY timestamp", (session_id,))
+            with storage.writer() as conn:
+                archive.add(conn, session_id, rows)
+            storage.executemany("DELETE FROM context WHERE id = ?", [(row[0],) for row in rows])
+        report("archived (facts + history)", scans())
+
+        samples = []
+        for session_id in sessions[:-1][:args.turns]:
+            start = time.perf_counter()
+            archive.messages(session_id)
+            samples.append(time.perf_counter() - start)
+        report("inflate one session", samples)
+
+        stats = archive.stats()
+        print(f"archived {stats['messages']} messages: {stats['raw_bytes'] / 1e3:.0f} KB raw, "
+              f"{stats['stored_bytes'] / 1e3:.0f} KB stored ({stats['stored_bytes'] / stats['raw_bytes']:.0%})")
+        storage.close()
+
+
+def bench_scheduler(args):
+    """A burst of concurrent requests against a client that returns 429s."""
+    from scheduler import RateLimitedClient
+
+    request = {"messages": [{"role": "user", "content": "hello " * 50}], "max_tokens": 256}
+
+    def burst(client):
+        latencies, errors = [], 0
+
+        def call(_):
+            start = time.perf_counter()
+            try:
+                client.chat.completions.create(**request)
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for elapsed in pool.map(call, range(args.turns)):
+                if elapsed is None:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+        return time.perf_counter() - start, latencies, errors
+
+    for label, client in (
+        ("direct", FakeGroqClient()),
+        ("scheduled", RateLimitedClient(FakeGroqClient(), rpm=3000, tpm=600_000,
+                                        max_concurrency=8, base_backoff=0.05)),
+    ):
+        wall, latencies, errors = burst(client)
+        print(f"{label:<10} {args.turns} requests in {wall:6.2f} s, {errors} failed")
+        if latencies:
+            report(f"  {label} latency", latencies)
+        if hasattr(client, "stats"):
+            print(f"  {client.stats()}")
+
+
+async def _http_json(reader, writer, method, path, payload=None):
+    """One keep-alive request to the chat server; returns (status, body)."""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _load_session(port, turns, latencies, errors):
+    """One simulated user: open a session, chat for turns prompts, end it."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, created = await _http_json(reader, writer, "POST", "/sessions")
+        session = created["session_id"]
+        for turn in range(turns):
+            start = time.perf_counter()
+            status, _ = await _http_json(reader, writer, "POST", f"/sessions/{session}/messages",
+                                         {"prompt": f"Turn {turn}: how do heaps keep order?"})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+        await _http_json(reader, writer, "DELETE", f"/sessions/{session}")
+    finally:
+        writer.close()
+
+
+def bench_server(args):
+    """Throughput and tail latency of the HTTP server under many concurrent sessions."""
+    import logic
+    from server import ChatServer
+
+    async def run():
+        server = ChatServer(port=0, llm_concurrency=32)
+        await server.start()
+        latencies, errors = [], []
+        start = time.perf_counter()
+        await asyncio.gather(*(_load_session(server.port, args.turns, latencies, errors)
+                               for _ in range(args.sessions)))
+        wall = time.perf_counter() - start
+        await server.close()
+        return wall, latencies, errors
+
+    with scratch_dir():
+        logic.client = FakeGroqClient(latency=0.02, error_rate=0.0)
+        logic.init_db()
+        wall, latencies, errors = asyncio.run(run())
+        logic.shutdown()
+
+    latencies.sort()
+    print(f"{args.sessions} sessions x {args.turns} turns: {len(latencies)} requests in {wall:.2f} s "
+          f"({len(latencies) / wall:.0f} req/s), {len(errors)} failed")
+    report("  turn latency", latencies)
+    print(f"  p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} ms")
+
+
+_PROMPT_SCRIPT = """
+import logic
+logic.init_db(background={background})
+print("ready", flush=True)
+logic.wait_until_ready()
+logic.shutdown()
+"""
+
+
+def _time_to_prompt(background):
+    """Seconds from launching a fresh interpreter until init_db returns."""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+               GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "bench"))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", _PROMPT_SCRIPT.format(background=background)],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True)
+    for line in process.stdout:
+        if line.strip() == "ready":
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        elapsed = None
+    process.wait()
+    return elapsed
+
+
+def _import_times(module):
+    """Cumulative import time in seconds of each module imported by module, via -X importtime."""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def bench_importtime(args):
+    """Startup cost: import time of main and wall-clock time to the first prompt."""
+    times = _import_times("main")
+    print(f"import main                  {times['main'] * 1000:8.1f} ms")
+    for name in ("groq", "numpy", "rich.console", "logic"):
+        if name in times:
+            print(f"  {name:<26} {times[name] * 1000:8.1f} ms")
+        else:
+            print(f"  {name:<26}      not imported")
+
+    with scratch_dir():
+        _write_snapshot_file("context.json", args.rows)
+        samples = {}
+        for background in (False, True):
+            samples[background] = [_time_to_prompt(background) for _ in range(3)]
+        for background, label in ((False, "blocking"), (True, "fast start")):
+            print(f"time to prompt ({label:<10}) {min(samples[background]) * 1000:8.1f} ms")
+
+    # Regression gate: a fast start must stay under the threshold
+    fast = min(samples[True])
+    if fast * 1000 > args.max_ms:
+        print(f"FAIL: fast start took {fast * 1000:.0f} ms, over the {args.max_ms:.0f} ms threshold")
+        raise SystemExit(1)
+
+
+BENCHMARKS = {
+    "importtime": bench_importtime,
+    "server": bench_server,
+    "scheduler": bench_scheduler,
+    "retention": bench_retention,
+    "archive": bench_archive,
+    "startup": bench_startup,
+    "extractor": bench_extractor,
+    "classifier": bench_classifier,
+    "journal": bench_journal,
+    "storage": bench_storage,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP chat micro-benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=10_000, help="history size to seed")
+    parser.add_argument("--turns", type=int, default=50, help="iterations to time")
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent sessions for the server benchmark")
+    parser.add_argument("--max-ms", type=float, default=500.0, help="time-to-prompt threshold for importtime")
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# context_window.py
+
+import os
+from functools import lru_cache
+
+# Total tokens the assembled prompt may use (excluding the reply)
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+# Per-message framing tokens added by the chat template
+MESSAGE_OVERHEAD = 4
+
+# Share of the budget reserved for prior summaries, pinned facts and the
+# omitted-history note
+PRIOR_SHARE = 0.15
+FACT_SHARE = 0.25
+SUMMARY_SHARE = 0.10
+
+# Characters of each omitted user message quoted in the summary note
+EXCERPT_CHARS = 80
+
+
+@lru_cache(maxsize=8192)
+def estimate_tokens(text):
+    """Cheap token estimate: about four characters per token, at least one per word."""
+    return max(len(text) // 4, len(text.split())) + MESSAGE_OVERHEAD
+
+
+def _excerpt(text):
+    """First line of a message, shortened for the summary note."""
+    line = " ".join(text.split())
+    if len(line) > EXCERPT_CHARS:
+        line = line[:EXCERPT_CHARS - 3].rstrip() + "..."
+    return line
+
+
+def _pin(header, lines, budget):
+    """The last lines that fit in budget under header, as one system message."""
+    used = estimate_tokens(header)
+    kept = []
+    for line in reversed(lines):
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+
+    if not kept:
+        return None, 0
+    kept.reverse()
+    return {"role": "system", "content": "\n".join([header] + kept)}, used
+
+
+def _pin_facts(facts, budget):
+    """Most recent facts that fit in budget, as one system message."""
+    return _pin("Known facts from earlier sessions:",
+                [f"- {fact['content']}" for fact in facts], budget)
+
+
+def _pin_summaries(summaries, budget):
+    """Most recent summaries of earlier conversation that fit in budget."""
+    return _pin("Summary of earlier conversation:", list(summaries), budget)
+
+
+def _summarize(dropped, budget):
+    """Deterministic note describing the omitted middle of the conversation."""
+    header = f"{len(dropped)} earlier messages were omitted. Earlier the user asked about:"
+    used = estimate_tokens(header)
+    lines = []
+    for msg in reversed(dropped):
+        if msg["role"] != "user":
+            continue
+        line = f"- {_excerpt(msg['content'])}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    lines.reverse()
+    return {"role": "system", "content": "\n".join([header] + lines)}, used
+
+
+def build_context(system_prompt, history, facts=(), budget=DEFAULT_TOKEN_BUDGET, min_recent=1,
+                  summaries=()):
+    """
+    Assemble the conversation sent to the model within a token budget.
+
+    Keeps the system prompt, the newest summaries of earlier conversation,
+    the newest pinned facts and as many of the most recent turns as fit;
+    the dropped middle is replaced by a short note. The output depends only
+    on the arguments.
+    """
+    conversation = [{"role": "system", "content": system_prompt}]
+    remaining = budget - estimate_tokens(system_prompt)
+
+    prior_msg, used = _pin_summaries(summaries, int(budget * PRIOR_SHARE))
+    if prior_msg:
+        conversation.append(prior_msg)
+        remaining -= used
+
+    facts_msg, used = _pin_facts(list(facts), int(budget * FACT_SHARE))
+    if facts_msg:
+        conversation.append(facts_msg)
+        remaining -= used
+
+    # Reserve room for the note before choosing recent turns
+    summary_budget = int(budget * SUMMARY_SHARE)
+    recent = []
+    for index in range(len(history) - 1, -1, -1):
+        msg = history[index]
+        cost = estimate_tokens(msg["content"])
+        reserve = summary_budget if index > 0 else 0
+        if len(recent) >= min_recent and cost + reserve > remaining:
+            break
+        recent.append({"role": msg["role"], "content": msg["content"]})
+        remaining -= cost
+    recent.reverse()
+
+    dropped = history[:len(history) - len(recent)]
+    if dropped:
+        summary_msg, _ = _summarize(dropped, summary_budget)
+        conversation.append(summary_msg)
+
+    conversation.extend(recent)
+    return conversation
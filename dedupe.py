@@ -0,0 +1,105 @@
+# dedupe.py
+
+import re
+import zlib
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+
+_WORD = re.compile(r"\w+")
+
+# MinHash signature layout: BANDS * ROWS_PER_BAND hash functions
+BANDS = 16
+ROWS_PER_BAND = 4
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 31) - 1
+
+
+@lru_cache(maxsize=None)
+def _coefficients():
+    """The MinHash functions' (a, b) coefficients; imports numpy on first use."""
+    import numpy as np
+
+    rng = np.random.default_rng(20240601)
+    a = rng.integers(1, _PRIME, size=BANDS * ROWS_PER_BAND, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=BANDS * ROWS_PER_BAND, dtype=np.uint64)
+    return a, b
+
+
+def normalize(content):
+    """Casefold and collapse whitespace so trivial edits hash the same."""
+    return " ".join(content.casefold().split())
+
+
+def content_hash(role, content):
+    """Stable hash of a message's role and normalized content."""
+    return hashlib.sha1(f"{role}\x00{normalize(content)}".encode("utf-8")).hexdigest()
+
+
+def shingles(content, size=SHINGLE_SIZE):
+    """Word shingles of the normalized content."""
+    words = _WORD.findall(normalize(content))
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(content):
+    """MinHash signature of the content's shingles."""
+    import numpy as np
+
+    grams = shingles(content)
+    if not grams:
+        return None
+    a, b = _coefficients()
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                         dtype=np.uint64, count=len(grams))
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % _PRIME).min(axis=1)
+
+
+def find_near_duplicates(items, threshold=0.8):
+    """
+    Group near-identical texts using MinHash with LSH banding.
+
+    items is an iterable of (id, content); returns lists of ids whose
+    estimated Jaccard similarity to another member is at least threshold.
+    """
+    import numpy as np
+
+    signatures = {}
+    buckets = defaultdict(list)
+    for item_id, content in items:
+        signature = minhash(content)
+        if signature is None:
+            continue
+        signatures[item_id] = signature
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            key = (band, signature[start:start + ROWS_PER_BAND].tobytes())
+            buckets[key].append(item_id)
+
+    # Union candidates whose signatures agree closely enough
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                if np.mean(signatures[a] == signatures[b]) >= threshold:
+                    parent[find(a)] = find(b)
+
+    groups = defaultdict(list)
+    for item_id in parent:
+        groups[find(item_id)].append(item_id)
+    return [group for group in groups.values() if len(group) > 1]
@@ -0,0 +1,130 @@
+# extractor.py
+
+import re
+
+# Context categories with their patterns, tried in order
+CONTEXT_PATTERNS = {
+    "Technical Fact": [
+        # Technical definitions
+        r"(?:it|this|that|they|he|she)\s+(?:is|are|was|were|means|refers to)\s+(?:a|an|the)?\s*([^.!?]+(?:system|architecture|framework|technology|method|process)[^.!?]+[.!?])",
+        # Technical characteristics
+        r"(?:the|a|an)\s+([^.!?]+(?:is|are|was|were)\s+(?:used for|designed to|implemented as|configured to)[^.!?]+[.!?])",
+        # Technical relationships
+        r"(?:it|this|that|they|he|she)\s+(?:connects|integrates|interacts|communicates)\s+(?:with|to|through)\s+([^.!?]+[.!?])"
+    ],
+    "Project Context": [
+        # Project structure
+        r"(?:the|this|that)\s+(?:project|system|application)\s+(?:has|contains|includes|consists of)\s+([^.!?]+[.!?])",
+        # Project requirements
+        r"(?:we|they|he|she)\s+(?:need|require|must have)\s+([^.!?]+[.!?])",
+        # Project constraints
+        r"(?:the|this|that)\s+(?:project|system|application)\s+(?:must|should|needs to)\s+([^.!?]+[.!?])"
+    ]
+}
+
+# Literals every pattern of a category needs; text without any of them
+# cannot match, so the category is skipped with one cheap scan
+CATEGORY_KEYWORDS = {
+    "Technical Fact": (
+        "system", "architecture", "framework", "technology", "method", "process",
+        "used for", "designed to", "implemented as", "configured to",
+        "connects", "integrates", "interacts", "communicates",
+    ),
+    "Project Context": (
+        "project", "system", "application", "need", "require", "must have",
+    ),
+}
+
+# Common meaningless patterns
+MEANINGLESS_PATTERNS = [
+    r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s+(?:a|an|the)\s*$",
+    r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s*$",
+    r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:have|has|had)\s*$",
+    r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:want|need|like|love)\s*$"
+]
+
+# Words that do not count towards information content
+COMMON_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+
+_MEANINGLESS = re.compile("|".join(f"(?:{p})" for p in MEANINGLESS_PATTERNS), re.IGNORECASE)
+
+
+def is_valid_context(context: str) -> bool:
+    """Validate if the extracted context is meaningful and complete."""
+    # Check minimum length (at least 3 words)
+    if len(context.split()) < 3:
+        return False
+
+    # Check for proper sentence ending
+    if not context.endswith(('.', '!', '?')):
+        return False
+
+    # Check for common meaningless patterns
+    if _MEANINGLESS.match(context):
+        return False
+
+    # Check for minimum information content
+    # Count significant words (excluding common words)
+    significant_words = set(context.lower().split()) - COMMON_WORDS
+
+    if len(significant_words) < 2:
+        return False
+
+    return True
+
+
+class ContextExtractor:
+    """Context extraction with every pattern compiled once."""
+
+    def __init__(self, patterns=CONTEXT_PATTERNS, keywords=CATEGORY_KEYWORDS):
+        self._categories = []
+        for category, sources in patterns.items():
+            # A keyword gate and then one combined scanner reject a category
+            # in a pass each; the individual patterns then run in order so the
+            # result matches trying each pattern on its own
+            gate = None
+            if category in keywords:
+                gate = re.compile("|".join(map(re.escape, keywords[category])))
+            scanner = re.compile("|".join(f"(?:{p})" for p in sources))
+            compiled = [re.compile(p) for p in sources]
+            self._categories.append((category, gate, scanner, compiled))
+
+    def extract(self, user_input: str, ai_response: str) -> str:
+        """Extract meaningful context from one user/assistant exchange."""
+        # Combine user input and AI response for analysis
+        combined = f"{user_input} {ai_response}".lower()
+
+        for category, gate, scanner, compiled in self._categories:
+            if gate is not None and gate.search(combined) is None:
+                continue
+            if scanner.search(combined) is None:
+                continue
+            for pattern in compiled:
+                for match in pattern.finditer(combined):
+                    context = match.group(1).strip()
+                    # Validate context quality
+                    if is_valid_context(context):
+                        return f"{category}: {context}"
+
+        return None
+
+    def extract_many(self, turns):
+        """
+        Yield the extracted context for each (user_input, ai_response) pair.
+
+        Yields None for pairs without context so results line up with turns.
+        """
+        extract = self.extract
+        for user_input, ai_response in turns:
+            yield extract(user_input, ai_response)
+
+
+def iter_turns(messages):
+    """Pair each user message with the assistant reply that follows it."""
+    user_input = None
+    for msg in messages:
+        if msg["role"] == "user":
+            user_input = msg["content"]
+        elif msg["role"] == "assistant" and user_input is not None:
+            yield user_input, msg["content"]
+            user_input = None
@@ -0,0 +1,122 @@
+# fact_pipeline.py
+
+import uuid
+import queue
+import threading
+from datetime import datetime, timezone
+
+from dedupe import content_hash
+from metrics import span
+
+_STOP = object()
+
+
+class FactPipeline:
+    """
+    Worker pool that classifies completed turns off the reply path.
+
+    classify(user_input, ai_response) returns (category, fact) for a turn
+    worth remembering, or None; each fact found is handed to store.put()
+    as an (id, role, content, source_session, category, timestamp,
+    content_hash) row, and then to on_fact if given. The queue is bounded:
+    submit() drops a turn rather than block the reply path when it is full,
+    unless block=True. record() stores a turn classified by the caller.
+    """
+
+    def __init__(self, classify, store, workers=2, max_queue=256, on_fact=None):
+        self.classify = classify
+        self.store = store
+        self.on_fact = on_fact
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.processed = 0
+        self.facts = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._workers = [
+            threading.Thread(target=self._run, name=f"fact-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, session_id, user_input, ai_response, block=False):
+        """Queue a turn for classification; False if it was dropped."""
+        try:
+            self._queue.put((session_id, user_input, ai_response), block=block)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._process(*item)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, session_id, user_input, ai_response):
+        """Classify one turn and store the fact it yields, if any."""
+        try:
+            with span("fact_classify"):
+                result = self.classify(user_input, ai_response)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return
+        self.record(session_id, result)
+
+    def record(self, session_id, result):
+        """Store the (category, fact) of a turn classified elsewhere; None if it had none."""
+        try:
+            if result is not None:
+                category, fact = result
+                timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                row = (str(uuid.uuid4()), "assistant", fact, session_id, category,
+                       timestamp, content_hash("assistant", fact))
+                self.store.put(row)
+                if self.on_fact is not None:
+                    self.on_fact(row)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.processed += 1
+            if result is not None:
+                self.facts += 1
+
+    def join(self):
+        """Wait until every queued turn has been classified."""
+        self._queue.join()
+
+    def stats(self):
+        """Queue depth and throughput counters."""
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "capacity": self._queue.maxsize,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "facts": self.facts,
+                "dropped": self.dropped,
+                "errors": self.errors,
+            }
+
+    def close(self):
+        """Classify what is queued, then stop the workers."""
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
@@ -0,0 +1,158 @@
+# journal.py
+
+import os
+import json
+import time
+import threading
+
+
+class Journal:
+    """Append-only JSONL message log compacted into memory shards."""
+
+    def __init__(self, path, shards, fsync_every=16, fsync_interval=1.0,
+                 compact_every=1000):
+        self.path = path
+        self.shards = shards
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lines = self._recover()
+        self._file = open(self.path, "ab")
+
+    def _recover(self):
+        """Drop a torn or corrupt tail left by a crash and count good lines."""
+        if not os.path.exists(self.path):
+            return 0
+
+        lines = 0
+        good_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                good_end += len(line)
+                lines += 1
+
+        if good_end != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+                f.flush()
+                os.fsync(f.fileno())
+        return lines
+
+    def append(self, entry):
+        """Append one message to the journal."""
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """Append several messages with a single write."""
+        data = b"".join(
+            json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+            for entry in entries
+        )
+        if not data:
+            return
+
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            self._lines += len(entries)
+            self._unsynced += len(entries)
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            compact = self._lines >= self.compact_every
+
+        if compact:
+            self.compact()
+
+    def _sync(self):
+        """fsync pending appends; caller holds the lock."""
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Force pending appends to disk."""
+        with self._lock:
+            self._file.flush()
+            if self._unsynced:
+                self._sync()
+
+    def compact(self):
+        """Write the journal out as a new shard and start a fresh one; returns the entry count."""
+        with self._lock:
+            self._file.flush()
+            with open(self.path, "r", encoding="utf-8") as f:
+                pending = [json.loads(line) for line in f]
+            if not pending:
+                return 0
+
+            self.shards.write(pending)
+            self._truncate()
+            return len(pending)
+
+    def _truncate(self):
+        """Empty the journal file; caller holds the lock."""
+        self._file.truncate(0)
+        self._file.seek(0)
+        self._sync()
+        self._lines = 0
+
+    def close(self):
+        """Flush, fsync and close the journal file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+
+def iter_snapshot(path, chunk_size=1 << 16):
+    """Yield the messages of a legacy JSON array snapshot without loading it whole."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and separators between messages
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != "[":
+                        raise json.JSONDecodeError("Expected '['", buffer, pos)
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # An entry cut off at the chunk boundary; read more
+                    if eof:
+                        raise
+                else:
+                    yield entry
+                    pos = end
+                    continue
+            elif eof:
+                if started:
+                    raise json.JSONDecodeError("Unterminated array", buffer, pos)
+                return
+
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
@@ -0,0 +1,127 @@
+# llm_cache.py
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from dedupe import normalize
+import queries
+
+
+def cache_key(model, params, messages):
+    """Hash of the model, sampling parameters and normalized conversation."""
+    window = [[msg["role"], normalize(msg["content"])] for msg in messages]
+    payload = json.dumps([model, sorted(params.items()), window], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Model replies stored in the llm_cache table behind an in-memory LRU.
+
+    Entries older than ttl seconds are treated as missing; beyond
+    max_entries the least recently used rows are evicted.
+    """
+
+    def __init__(self, storage, max_entries=1000, ttl=7 * 24 * 3600, memory_entries=128):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._touched = {}
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The cached reply for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+        row = self.storage.query_one(queries.CACHE_LOOKUP, (key,))
+        if row is None or now - row[1] >= self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, row[0], row[1])
+            self._touched[key] = now
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, response):
+        """Store a reply and evict expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            touched = list(self._touched.items())
+            self._touched.clear()
+
+        with self.storage.writer() as conn:
+            conn.executemany("UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                             [(used, touched_key) for touched_key, used in touched])
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_cache (key, response, created, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (key, response, now, now))
+            expired = conn.execute("DELETE FROM llm_cache WHERE created < ?",
+                                   (now - self.ttl,)).rowcount
+            # Keep the max_entries most recently used rows
+            overflow = conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        with self._lock:
+            self.evictions += expired + overflow
+
+    def _remember(self, key, response, created):
+        """Add to the in-memory LRU; caller holds the lock."""
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        """Write recency updates from cache hits to the table."""
+        with self._lock:
+            touched = list(self._touched.items())
+            self._touched.clear()
+        if touched:
+            self.storage.executemany("UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                                     [(used, key) for key, used in touched])
+
+    def clear(self):
+        """Drop every cached reply."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+        self.storage.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """Hit/miss counters and the number of stored entries."""
+        entries = self.storage.query_one("SELECT count(*) FROM llm_cache")[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,104 +1,409 @@
 # logic.py
 
-import sqlite3
 import os
 import json
 import uuid
-from datetime import datetime
+import time
+import hashlib
+import threading
+import queue
+from concurrent.futures import Future, wait
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from rich.console import Console
-from groq import Groq
+from rich.markup import escape
 import subprocess
 import re
+from itertools import groupby
+from storage import get_storage, close_storage, WriteBehindQueue
+from journal import Journal, iter_snapshot
+from shards import ShardStore
+from context_window import build_context, estimate_tokens, DEFAULT_TOKEN_BUDGET
+from extractor import ContextExtractor, is_valid_context, iter_turns
+from sync import GitSync
+from dedupe import content_hash, find_near_duplicates
+from llm_cache import ResponseCache, cache_key
+from metrics import span, timed, record
+from scheduler import RateLimitedClient
+from fact_pipeline import FactPipeline
+from summarizer import Summarizer
+from retention import ImportanceHeap
+from archive import SessionArchive, SCHEMA as ARCHIVE_SCHEMA
+import queries
 
 # Load environment variables from .env
 load_dotenv()
 
 DB_PATH = "context.db"
 JSON_PATH = "context.json"
+JOURNAL_PATH = "context.jsonl"
+SHARD_DIR = "memory"  # Git-synced memory shards and their manifest
+INDEX_PATH = os.path.splitext(DB_PATH)[0] + ".vec"
+ARCHIVE_PATH = os.path.splitext(DB_PATH)[0] + ".archive.db"  # Compressed turns of ended sessions
+ARCHIVE_LEVEL = int(os.getenv("ARCHIVE_LEVEL", "6"))  # zlib level of archived chunks
+FACT_TOP_K = int(os.getenv("FACT_TOP_K", "8"))
+FACT_MIN_SCORE = 0.05  # Cosine similarity below this counts as unrelated
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "30"))  # Seconds between commits
+SYNC_EXIT_TIMEOUT = float(os.getenv("SYNC_EXIT_TIMEOUT", "10"))  # Max wait for the push on exit
+MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.0 if os.getenv("MCP_DETERMINISTIC") == "1" else 0.7
+MAX_TOKENS = 256  # Reduced from 1024 to 256
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))  # Stored replies
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds a reply stays valid
+LLM_CACHE_ALWAYS = os.getenv("LLM_CACHE_ALWAYS") == "1"  # Also cache sampled (temperature > 0) replies
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))  # Requests per minute allowed by the API plan
+GROQ_TPM = int(os.getenv("GROQ_TPM", "6000"))  # Tokens per minute allowed by the API plan
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+FACT_WORKERS = int(os.getenv("FACT_WORKERS", "2"))  # Threads classifying turns
+FACT_QUEUE_SIZE = int(os.getenv("FACT_QUEUE_SIZE", "256"))  # Turns waiting before new ones are dropped
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "3000"))  # Raw session history that starts a fold
+SUMMARY_MIN_TOKENS = int(os.getenv("SUMMARY_MIN_TOKENS", "200"))  # Shorter ended sessions stay verbatim
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "6"))  # Messages a mid-session fold leaves verbatim
+SUMMARY_FANOUT = int(os.getenv("SUMMARY_FANOUT", "8"))  # Summaries merged into one of the next level
+SUMMARY_MAX_TOKENS = 256  # Longest summary the model may write
+SUMMARY_EXIT_TIMEOUT = float(os.getenv("SUMMARY_EXIT_TIMEOUT", "10"))  # Max wait for the last folds on exit
+PRIOR_SUMMARIES = int(os.getenv("PRIOR_SUMMARIES", "4"))  # Earlier summaries sent with each prompt
+FACT_MAX_COUNT = int(os.getenv("FACT_MAX_COUNT", "5000"))  # Facts kept per store before eviction
+FACT_MAX_BYTES = int(os.getenv("FACT_MAX_BYTES", str(2 << 20)))  # Fact text kept per store
+FACT_HALF_LIFE_DAYS = float(os.getenv("FACT_HALF_LIFE_DAYS", "14"))  # Age at which an access counts half
+FACT_LOW_WATER = 0.9  # Eviction frees down to this share of each limit
+MEMORY_PAGE_SIZE = int(os.getenv("MEMORY_PAGE_SIZE", "20"))  # Messages per /memory page
+SYSTEM_PROMPT = "You are a concise assistant. Keep responses brief and to the point. Use short sentences and avoid unnecessary details."
 console = Console()
+_extractor = ContextExtractor()
 
-# Groq client for llama
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+_journal = None
+_shards = None
+_writes = None
+_index = None
+_sync = None
+_session_id = None
+_cache = None
+_client_lock = threading.Lock()
+_index_lock = threading.Lock()
+_facts = None
+_fact_writes = None
+_facts_lock = threading.Lock()
+_stores = None  # Importance bookkeeping per fact table
+_stores_lock = threading.Lock()
+_evict_lock = threading.Lock()
+_summarizer = None
+_summary_jobs = None
+_summary_pending = {}  # (session_id, final) -> queued fold
+_summary_lock = threading.Lock()
+_summary_closing = threading.Event()  # Set by shutdown(); folds still running write nothing
+_startup = None  # Background pull and import started by init_db
+_archive = None
+_archive_lock = threading.Lock()
 
-def init_db():
-    """Initialize the database and start a new session."""
-    if not os.path.exists(DB_PATH):
-        from setup_db import setup_database
-        setup_database()
+def get_client():
+    """Return the Groq client, importing groq and building it on first use."""
+    # An assigned logic.client (e.g. a fake) takes precedence
+    current = globals().get("client")
+    if current is None:
+        with _client_lock:
+            current = globals().get("client")
+            if current is None:
+                from groq import Groq
+                
+                # Groq client for llama, paced to the plan's rate limits; the
+                # SDK's own retries would bypass the buckets and the breaker
+                current = RateLimitedClient(
+                    Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0),
+                    rpm=GROQ_RPM, tpm=GROQ_TPM,
+                    max_concurrency=GROQ_MAX_CONCURRENCY, max_retries=GROQ_MAX_RETRIES,
+                )
+                globals()["client"] = current
+    return current
+
+def __getattr__(name):
+    # logic.client is built on first access; importing groq is slow
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _db():
+    """Return the shared connection pool for DB_PATH, with the archive attached."""
+    return get_storage(DB_PATH, attach={ARCHIVE_SCHEMA: ARCHIVE_PATH})
+
+def _journal_rows(rows):
+    """Append committed message rows to the local journal."""
+    journal().append_many([
+        {"id": _id, "role": role, "content": content}
+        for _id, _, role, content, _, _, _ in rows
+    ])
+
+def _report_write_error(e):
+    console.print(f"[red]Failed to save messages: {e}[/red]")
+
+def _write_queue():
+    """Return the background queue that persists new messages."""
+    global _writes
+    if _writes is None:
+        # A fact already stored under the same content hash is refreshed
+        # instead of duplicated
+        _writes = WriteBehindQueue(_db(), """
+            INSERT INTO context (id, session_id, role, content, is_fact, timestamp, content_hash) 
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (content_hash) WHERE is_fact = 1
+            DO UPDATE SET timestamp = excluded.timestamp
+        """, on_commit=_journal_rows, on_error=_report_write_error)
+    return _writes
+
+def flush_writes():
+    """Wait until every queued message is committed."""
+    if _writes is not None:
+        _writes.flush()
+
+def _pending_rows(session_id=None):
+    """Queued (id, role, content, is_fact) rows not yet in the database."""
+    if _writes is None:
+        return []
+    return [(_id, role, content, int(is_fact))
+            for _id, session, role, content, is_fact, _, _ in _writes.pending()
+            if session_id is None or session == session_id]
+
+def _pending_fact_rows():
+    """Queued (id, role, content) rows of classified facts not yet in the facts table."""
+    if _fact_writes is None:
+        return []
+    return [(_id, role, content) for _id, role, content, _, _, _, _ in _fact_writes.pending()]
+
+def _merge_pending(rows, pending):
+    """Append queued rows the database read did not see yet."""
+    if not pending:
+        return rows
+    stored = {row[0] for row in rows}
+    return rows + [row for row in pending if row[0] not in stored]
+
+def fact_index():
+    """Return the fact vector index, loading or rebuilding it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                # numpy is imported with the index, off the startup path
+                from vector_index import VectorIndex
+                
+                index = VectorIndex(INDEX_PATH)
+                # Stored facts and the facts classified from turns
+                facts = [(fact["id"], fact["content"]) for fact in get_facts()]
+                facts += _db().query("SELECT id, content FROM facts")
+                if not index.load() or set(index.ids()) != {_id for _id, _ in facts}:
+                    index.clear()
+                    index.add([_id for _id, _ in facts], [content for _, content in facts])
+                _index = index
+    return _index
+
+def response_cache():
+    """Return the LLM response cache."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(_db(), max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+    return _cache
+
+def _cached_reply_key(conversation):
+    """Cache key for a request, or None when its reply should not be cached."""
+    # Only deterministic requests repeat their reply by default
+    if TEMPERATURE != 0 and not LLM_CACHE_ALWAYS:
+        return None
+    params = {"temperature": TEMPERATURE, "max_tokens": MAX_TOKENS}
+    return cache_key(MODEL, params, conversation)
+
+def cache_stats():
+    """Hit/miss counters of the LLM response cache."""
+    return response_cache().stats()
+
+def clear_cache():
+    """Forget every cached LLM reply."""
+    response_cache().clear()
+
+def api_stats():
+    """Request, retry and circuit breaker counters of the API client."""
+    stats = getattr(globals().get("client"), "stats", None)
+    return stats() if stats else None
+
+def journal():
+    """Return the local message journal, recovering it on first use."""
+    global _journal
+    if _journal is None:
+        _journal = Journal(JOURNAL_PATH, shard_store())
+    return _journal
+
+def shard_store():
+    """Return the git-synced shard directory."""
+    global _shards
+    if _shards is None:
+        # Every new shard is committed and pushed, whichever path wrote it
+        _shards = ShardStore(SHARD_DIR, on_write=lambda name: request_sync())
+    return _shards
+
+def shutdown():
+    """Flush pending local writes and close storage."""
+    global _journal, _writes, _index, _cache, _facts, _fact_writes, _summary_jobs, _archive
+    wait_until_ready(SYNC_EXIT_TIMEOUT)
+    if _summary_jobs is not None:
+        # Give the folds of sessions that have already ended a bounded time;
+        # one still waiting on the model is dropped, and its session is
+        # archived unsummarized at the next start
+        with _summary_lock:
+            pending = list(_summary_pending.values())
+        wait(pending, timeout=SUMMARY_EXIT_TIMEOUT)
+        _summary_closing.set()
+        for future in pending:
+            future.cancel()
+        with _summary_lock:
+            _summary_pending.clear()
+        _summary_jobs.put(None)
+        _summary_jobs = None
+    if _facts is not None:
+        _facts.close()
+    if _stores is not None:
+        # Evict what the last turns pushed over and keep the access counts
+        enforce_fact_limits()
+    if _facts is not None:
+        _fact_writes.close()
+        _facts = _fact_writes = None
+    if _writes is not None:
+        _writes.close()
+        _writes = None
+    if _index is not None:
+        _index.save()
+        _index = None
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+    if _cache is not None:
+        _cache.flush()
+        _cache = None
+    _archive = None
+    close_storage()
+
+def init_db(background=False):
+    """
+    Initialize the database and start a new session.
+
+    With background=True the git pull and snapshot import run on a thread
+    so the prompt appears at once; calls that need the imported memory
+    wait for it through wait_until_ready().
+    """
+    global _session_id, _startup
+    from setup_db import migrate
+    
+    # Create the schema or upgrade an older database in place
+    with _db().writer() as conn:
+        migrate(conn)
+    _summary_closing.clear()
     
     # Start new session
-    session_id = str(uuid.uuid4())
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO sessions (id, start_time) 
-        VALUES (?, CURRENT_TIMESTAMP)
-    """, (session_id,))
-    conn.commit()
-    conn.close()
+    session_id = start_session()
+    _session_id = session_id
+    
+    if background:
+        _startup = threading.Thread(target=_load_memory, args=(session_id,),
+                                    name="startup-import", daemon=True)
+        _startup.start()
+    else:
+        _load_memory(session_id)
+    
+    return session_id
+
+def _load_memory(session_id):
+    """Pull and import the shared memory, then adopt unattributed messages."""
+    # Move sessions ended in earlier runs out of the hot tables before the
+    # import marks their turns as facts
+    try:
+        archive_ended_sessions()
+    except Exception as e:
+        console.print(f"[red]Error archiving sessions: {e}[/red]")
     
     # Load facts from GitHub
     pull_json_from_github()
     
+    # Attribute imported and pre-migration messages to this session
+    _db().execute(queries.SESSION_BACKFILL, (session_id,))
     
-    
+    # Bring the fact stores back within their limits after the import
+    try:
+        enforce_fact_limits()
+    except Exception as e:
+        console.print(f"[red]Error evicting facts: {e}[/red]")
+
+def wait_until_ready(timeout=None):
+    """Block until a background startup import has finished; False on timeout."""
+    startup = _startup
+    if startup is None or startup is threading.current_thread():
+        return True
+    startup.join(timeout)
+    return not startup.is_alive()
+
+def start_session():
+    """Record a new conversation session and return its id."""
+    session_id = str(uuid.uuid4())
+    _db().execute("""
+        INSERT INTO sessions (id, start_time) 
+        VALUES (?, CURRENT_TIMESTAMP)
+    """, (session_id,))
     return session_id
 
-def add_message(role, content, is_fact=False):
-    """Add a message to the current session context."""
+def end_session(session_id, wait=False, timeout=None):
+    """
+    Mark a session as finished and fold its turns into its summary.
+
+    The fold runs on the summary worker; with wait=True this returns once
+    it is done or timeout seconds have passed.
+    """
+    _db().execute("UPDATE sessions SET end_time = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+    future = request_summary(session_id, final=True)
+    if wait and future is not None:
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            pass
+
+@timed("add_message")
+def add_message(role, content, is_fact=False, session_id=None):
+    """Add a message to session_id, or to the current session."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Store both user and assistant messages
+        # Store both user and assistant messages; the write-behind queue
+        # commits them and appends them to the local journal
         message_id = str(uuid.uuid4())
-        cursor.execute("""
-            INSERT INTO context (id, role, content, is_fact) 
-            VALUES (?, ?, ?, ?)
-        """, (message_id, role, content, is_fact))
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        digest = content_hash(role, content)
         
-        # Save to context.json immediately (local only)
-        try:
-            # Read existing messages
-            if os.path.exists(JSON_PATH):
-                with open(JSON_PATH, "r", encoding="utf-8") as f:
-                    messages = json.load(f)
-            else:
-                messages = []
-            
-            # Add new message
-            messages.append({
-                "id": message_id,
-                "role": role,
-                "content": content
-            })
-            
-            # Save back to file (local only)
-            with open(JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump(messages, f, indent=2)
-                
-        except Exception as e:
-            pass  # Silently handle errors
+        if is_fact:
+            # Refresh a stored copy of the same fact rather than adding one
+            existing = _db().query_one(queries.FACT_BY_HASH, (digest,))
+            if existing:
+                _db().execute("UPDATE context SET timestamp = ? WHERE id = ?",
+                              (timestamp, existing[0]))
+                fact_stores()["context"].touch([digest], time.time())
+                return existing[0]
         
-        conn.commit()
-        conn.close()
+        _write_queue().put((message_id, session_id or _session_id, role, content, is_fact, timestamp, digest))
+        if is_fact:
+            fact_index().add([message_id], [content])
+            store = fact_stores()["context"]
+            store.add(digest, len(content.encode("utf-8")), fact_confidence(content), last=time.time())
+            if store.over_limit():
+                enforce_fact_limits()
+        return message_id
     except Exception as e:
         pass  # Silently handle errors
 
-def get_messages():
-    """Get all messages from the current session."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@timed("get_messages")
+def get_messages(session_id=None):
+    """Get all messages, or only those of session_id."""
+    # Snapshot queued writes first so none fall between the two reads
+    pending = _pending_rows(session_id)
     
     # Get messages
-    cursor.execute("""
-        SELECT id, role, content, is_fact 
-        FROM context 
-        ORDER BY timestamp
-    """)
-    rows = cursor.fetchall()
-    conn.close()
+    if session_id is None:
+        rows = _db().query(queries.GET_MESSAGES)
+    else:
+        rows = _db().query(queries.SESSION_MESSAGES, (session_id,))
+    rows = _merge_pending(rows, pending)
     
     messages = [{"id": _id, "role": role, "content": content, "is_fact": is_fact} 
             for _id, role, content, is_fact in rows]
@@ -108,99 +413,219 @@ def get_messages():
 
 def get_facts():
     """Get only factual messages from the current session."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, role, content 
-        FROM context 
-        WHERE is_fact = 1 
-        ORDER BY timestamp
-    """)
-    rows = cursor.fetchall()
-    conn.close()
+    pending = [row for row in _pending_rows() if row[3]]
+    rows = _db().query(queries.GET_FACTS)
+    rows = _merge_pending(rows, pending)
     return [{"id": _id, "role": role, "content": content} 
-            for _id, role, content in rows]
+            for _id, role, content, _ in rows]
+
+def git_sync():
+    """Return the background git sync worker, starting it on first use."""
+    global _sync
+    if _sync is None:
+        _sync = GitSync([SHARD_DIR], interval=SYNC_INTERVAL)
+    return _sync
+
+def request_sync(message=None):
+    """Queue a commit and push of the memory files."""
+    git_sync().mark_dirty(message)
+
+def sync_status():
+    """Current state of the background git sync."""
+    return git_sync().status()
 
 def save_session_to_github():
-    """Save all messages from the current session to GitHub."""
+    """Write what changed since the last save to a new memory shard and queue a push to GitHub."""
     try:
-        # Get all messages from the database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, role, content 
-            FROM context 
-            ORDER BY timestamp DESC
-        """)
-        messages = [{"id": _id, "role": role, "content": content} 
-                for _id, role, content in cursor.fetchall()]
-        conn.close()
-        
-        if not messages:
-            console.print("[yellow]No messages to save.[/yellow]")
-            return
+        wait_until_ready()
+        flush_writes()
         
+        # New messages, summaries and deletions go into one new shard;
+        # shards already pushed are never rewritten
+        with span("shard_write"):
+            count = journal().compact()
         
-        # Save messages to JSON
-        with open(JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(messages, f, indent=2)
-        
-        # Push to GitHub
-        try:
-            # Add the file
-            subprocess.run(["git", "add", JSON_PATH], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-            # Commit with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            commit_msg = f"Update conversation - {timestamp}"
-            subprocess.run(["git", "commit", "-m", commit_msg], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-            # Push changes
-            subprocess.run(["git", "push"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-           
-            
-        except subprocess.CalledProcessError as e:
-            console.print(f"[red]Failed to push to GitHub: {e}[/red]")
-            # If push fails, try to pull first and then push again
-            try:
-                subprocess.run(["git", "pull", "--rebase"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                subprocess.run(["git", "push"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                console.print("[green]Successfully saved conversation to GitHub after resolving conflicts[/green]")
-            except subprocess.CalledProcessError as e2:
-                console.print(f"[red]Failed to resolve GitHub conflicts: {e2}[/red]")
+        # The shard store queues a push for every shard it writes
+        if not count:
+            console.print("[yellow]No new messages to save.[/yellow]")
+            # Shards from an earlier run may still be waiting for their push
+            if _shards_uncommitted():
+                request_sync()
+        return count
     except Exception as e:
         console.print(f"[red]Error saving to GitHub: {e}[/red]")
+        return 0
+
+def _shards_uncommitted():
+    """Whether the shard directory has files or edits git has not committed."""
+    try:
+        result = subprocess.run(["git", "status", "--porcelain", "--", SHARD_DIR],
+                                capture_output=True, text=True)
+    except OSError:
+        return False
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+def _tombstone(ids):
+    """Record deletions in the journal so they reach the other machines."""
+    journal().append_many([{"id": _id, "deleted": True} for _id in ids])
+
+def _forget(ids):
+    """Delete the messages and summaries named by imported tombstones."""
+    hashes = []
+    with _db().writer() as conn:
+        for _id in ids:
+            row = conn.execute("SELECT content_hash FROM context WHERE id = ? AND is_fact = 1",
+                               (_id,)).fetchone()
+            if row:
+                hashes.append(row[0])
+        conn.executemany("DELETE FROM context WHERE id = ?", [(_id,) for _id in ids])
+        conn.executemany("UPDATE sessions SET summary_id = NULL WHERE summary_id = ?", [(_id,) for _id in ids])
+        conn.executemany("DELETE FROM summaries WHERE id = ?", [(_id,) for _id in ids])
+    for _id in ids:
+        fact_index().remove(_id)
+    store = fact_stores()["context"]
+    for digest in hashes:
+        store.remove(digest)
+
+def _import_entries(entries):
+    """
+    Load memory entries into the database in one pass.
+
+    Messages are stored as facts after deduplication; messages already
+    stored are marked as facts instead of being added again. Summary
+    entries go to the summaries table and tombstones delete what they
+    name. Returns the number of messages imported.
+    """
+    # Validate the vector index against the facts stored before the import,
+    # and load their importance before the new ones are added
+    index = fact_index()
+    store = fact_stores()["context"]
+    
+    # Facts already stored are skipped by content hash
+    seen_hashes = {digest for (digest,) in _db().query(
+        "SELECT content_hash FROM context WHERE is_fact = 1")}
+    seen_ids = set()
+    rows = []
+    summaries = []
+    children = []
+    deleted = []
+    for entry in entries:
+        if entry.get("deleted"):
+            deleted.append(entry["id"])
+            continue
+        if entry.get("role") == "summary":
+            summaries.append((entry["id"], entry.get("level", 0), entry["content"], entry.get("timestamp")))
+            children.extend((entry["id"], child) for child in entry.get("children", ()))
+            continue
+        digest = content_hash(entry["role"], entry["content"])
+        fact_id = entry.get("id") or str(uuid.uuid4())
+        if fact_id in seen_ids or digest in seen_hashes:
+            continue
+        seen_ids.add(fact_id)
+        seen_hashes.add(digest)
+        rows.append((fact_id, entry["role"], entry["content"], digest))
+    
+    # Messages deleted later in the same batch are never added
+    if deleted:
+        gone = set(deleted)
+        rows = [row for row in rows if row[0] not in gone]
+    
+    if summaries:
+        # A rolling summary appears once per update; the last one wins
+        _db().executemany("""
+            INSERT INTO summaries (id, level, content, last_time) 
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET content = excluded.content, last_time = excluded.last_time
+        """, summaries)
+        _db().executemany("UPDATE summaries SET parent_id = ? WHERE id = ?", children)
+    
+    if rows:
+        _db().executemany("""
+            INSERT INTO context (id, role, content, is_fact, content_hash) 
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (id) DO UPDATE SET is_fact = 1
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM context AS f 
+                    WHERE f.content_hash = context.content_hash AND f.is_fact = 1
+                )
+            ON CONFLICT (content_hash) WHERE is_fact = 1 DO NOTHING
+        """, rows)
+        unindexed = [row for row in rows if row[0] not in index]
+        index.add([row[0] for row in unindexed], [row[2] for row in unindexed])
+        
+        now = time.time()
+        for _, _, content, digest in rows:
+            store.add(digest, len(content.encode("utf-8")), fact_confidence(content), last=now)
+    
+    if deleted:
+        _forget(deleted)
+    return len(rows)
+
+def import_snapshot(path=JSON_PATH):
+    """
+    Bulk-load a legacy context.json snapshot into the database as facts.
+
+    Memory is synced as shards now, so each version of the file is
+    imported once; it only changes if a machine still writes the old
+    format. Returns the number of messages imported.
+    """
+    if not os.path.exists(path):
+        return 0
+    
+    with open(path, "rb") as f:
+        name = f"{os.path.basename(path)}:{hashlib.file_digest(f, 'sha256').hexdigest()}"
+    if _db().query_one("SELECT 1 FROM synced_shards WHERE name = ?", (name,)):
+        return 0
+    
+    count = _import_entries(iter_snapshot(path))
+    _db().execute("INSERT INTO synced_shards (name) VALUES (?)", (name,))
+    return count
+
+def import_shards():
+    """
+    Import the memory shards not seen before, in manifest order.
+
+    A shard listed before its file has arrived is picked up by a later
+    pull. Returns the number of messages imported.
+    """
+    store = shard_store()
+    seen = {name for (name,) in _db().query("SELECT name FROM synced_shards")}
+    imported = 0
+    for name in store.manifest():
+        if name in seen:
+            continue
+        try:
+            entries = store.read(name)
+        except FileNotFoundError:
+            continue
+        except ValueError as e:
+            console.print(f"[red]Skipping memory shard: {e}[/red]")
+            continue
+        imported += _import_entries(entries)
+        _db().execute("INSERT INTO synced_shards (name) VALUES (?)", (name,))
+    return imported
 
 def pull_json_from_github():
     """Pull facts from GitHub at session start."""
     try:
         # Pull latest changes
-        subprocess.run(["git", "pull"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        if os.path.exists(JSON_PATH):
-            with open(JSON_PATH, "r", encoding="utf-8") as f:
-                facts = json.load(f)
-            
-            if facts:
-               
-                
-                # Clear existing facts to avoid duplicates
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM facts")
-                conn.commit()
-                
-                # Add facts to database
-                for fact in facts:
-                    add_message(fact["role"], fact["content"], is_fact=True)
-                
-                conn.close()
-            
-        else:
-            console.print("[yellow]context.json not found in repository[/yellow]")
-            
+        with span("git_pull"):
+            # Local shard commits replay on top; the union-merged manifest
+            # takes both sides' lines
+            subprocess.run(["git", "pull", "--rebase", "--autostash"], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     except subprocess.CalledProcessError as e:
         console.print(f"[red]Failed to pull from GitHub: {e}[/red]")
+    
+    # Import local shards even if the pull failed
+    try:
+        # Write any journaled messages from the last run out as a shard
+        with span("journal_compact"):
+            journal().compact()
+        
+        import_snapshot()
+        with span("shard_import"):
+            import_shards()
     except json.JSONDecodeError as e:
         console.print(f"[red]Error parsing context: {e}[/red]")
     except Exception as e:
@@ -209,24 +634,31 @@ def pull_json_from_github():
 def clear_session():
     """End current session and start a new one."""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        wait_until_ready()
+        flush_writes()
+        
+        # Everything cleared here is forgotten on the other machines too
+        ids = [_id for (_id,) in _db().query("SELECT id FROM context")]
         
-        # End current session
-        cursor.execute("""
-            UPDATE sessions 
-            SET end_time = CURRENT_TIMESTAMP 
-            WHERE end_time IS NULL
-        """)
+        # Keep a summary of the conversation being cleared
+        end_session(_session_id, wait=True, timeout=SUMMARY_EXIT_TIMEOUT)
         
-        # Clear context table
-        cursor.execute("DELETE FROM context")
-        conn.commit()
-        conn.close()
+        with _db().writer() as conn:
+            # End current session
+            conn.execute(queries.CLOSE_SESSIONS)
         
-        # Clear context.json
-        with open(JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump([], f)
+        # Ended conversations stay readable in the archive
+        archive_ended_sessions()
+        
+        # Clear the facts left in the context table
+        _db().execute("DELETE FROM context")
+        _tombstone(ids)
+        # Facts classified from turns stay retrievable
+        index = fact_index()
+        for _id in ids:
+            index.remove(_id)
+        if _stores is not None:
+            _stores["context"].clear()
         
         # Start new session
         init_db()
@@ -234,218 +666,731 @@ def clear_session():
     except Exception as e:
         return False
 
+# Keywords that indicate factual information
+FACT_KEYWORDS = (
+    " is ", " are ", " was ", " were ", " means ", " stands for ", " used to ",
+    " include ", " such as ", " examples ", " definition ", " important ",
+    " consists of ", " helps ", " allows ", " can be ", " typically ", " commonly ",
+    " usually ", " consists ", " refers to ", " characteristics ", " types ",
+    " consist of ", " based on ", " requires ", " needs ", " must ", " should ",
+    " will ", " has ", " have ", " had ", " connects ", " integrates ", " interacts ",
+    " communicates ", " depends on ", " relies on ", " uses ", " implements ",
+    " property ", " attribute ", " feature ", " capability ", " functionality ",
+    " behavior ", " structure ", " architecture ", " performs ", " executes ",
+    " processes ", " handles ", " manages ", " controls ", " operates ", " functions ",
+    " state ", " status ", " condition ", " mode ", " configuration ", " setting ",
+    " parameter ", " because ", " since ", " as ", " due to ", " therefore ", " thus ",
+    " in fact ", " actually ", " indeed ", " specifically ", " particularly ",
+    " especially ", " notably ", " importantly ", " significantly ", " primarily ",
+    " mainly ", " mostly ", " largely ", " generally ", " frequently ", " often ",
+    " always ", " never ", " sometimes ", " occasionally ", " rarely ",
+)
+
+# Technical and film terms that mark a response as worth keeping
+TECHNICAL_TERMS = (
+    "api", "database", "server", "client", "protocol", "interface", "function",
+    "method", "class", "object", "variable", "constant", "module", "package", "library",
+    "framework", "architecture", "system", "application", "service", "component",
+    "feature", "movie", "film", "character", "plot", "story", "director", "actor",
+    "actress", "scene", "sequence", "theme", "genre", "cinema", "cinematic", "visual",
+    "special effects", "soundtrack", "score", "editing", "cinematography", "production",
+    "writer", "screenplay", "script", "dialogue", "monologue", "performance", "acting",
+    "role", "protagonist", "antagonist", "supporting", "cast", "crew", "budget",
+    "box office", "revenue", "release", "premiere", "theater", "audience", "review",
+    "critic", "rating", "award", "nomination", "academy", "oscar", "golden globe",
+    "bafta", "cannes", "venice", "berlin", "sundance", "tribeca", "independent",
+    "studio", "company", "distributor", "marketing", "promotion", "trailer", "teaser",
+    "poster", "artwork", "design", "concept", "development", "pre-production",
+    "post-production", "sound", "music", "visual effects", "stunts", "action", "drama",
+    "comedy", "thriller", "horror", "sci-fi", "fantasy", "romance", "documentary",
+    "animation", "live action", "3D", "IMAX", "format", "resolution", "aspect ratio",
+    "song", "sound design", "mixing", "color", "grading",
+)
+
+def _trie_pattern(terms):
+    """Regex source matching any of terms, factored into a prefix trie."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        if list(node) == [""]:
+            return ""
+        alternatives = [re.escape(ch) + build(child)
+                        for ch, child in sorted(node.items()) if ch]
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+# One precompiled scanner over both term sets; a single search of the
+# lowercased response finds any keyword or term in one pass
+_FACT_MATCHER = re.compile(_trie_pattern(set(FACT_KEYWORDS) | set(TECHNICAL_TERMS)))
+
 def is_fact_response(response: str) -> bool:
     """Determine if a response contains factual information or meaningful context."""
-    # Keywords that indicate factual information
-    fact_keywords = [
-        # Technical facts
-        " is ", " are ", " was ", " were ", " means ", " stands for ", " used to ",
-        " include ", " such as ", " examples ", " definition ", " important ",
-        " consists of ", " helps ", " allows ", " can be ", " typically ",
-        " commonly ", " usually ", " consists ", " refers to ", " characteristics ",
-        " types ", " consist of ", " based on ", " requires ", " needs ",
-        " must ", " should ", " will ", " has ", " have ", " had ",
-        # Technical relationships
-        " connects ", " integrates ", " interacts ", " communicates ",
-        " depends on ", " relies on ", " uses ", " implements ",
-        # Technical properties
-        " property ", " attribute ", " feature ", " capability ",
-        " functionality ", " behavior ", " structure ", " architecture ",
-        # Technical actions
-        " performs ", " executes ", " processes ", " handles ",
-        " manages ", " controls ", " operates ", " functions ",
-        # Technical states
-        " state ", " status ", " condition ", " mode ",
-        " configuration ", " setting ", " parameter ",
-        # General facts
-        " because ", " since ", " as ", " due to ", " therefore ", " thus ",
-        " in fact ", " actually ", " indeed ", " specifically ", " particularly ",
-        " especially ", " notably ", " importantly ", " significantly ",
-        " primarily ", " mainly ", " mostly ", " largely ", " generally ",
-        " typically ", " usually ", " commonly ", " frequently ", " often ",
-        " always ", " never ", " sometimes ", " occasionally ", " rarely "
-    ]
-    
-    response_lower = response.lower()
-    
-    # Check for fact keywords
-    has_fact_keywords = any(keyword in response_lower for keyword in fact_keywords)
-    
-    # Check for technical terms
-    technical_terms = ["api", "database", "server", "client", "protocol", "interface",
-                      "function", "method", "class", "object", "variable", "constant",
-                      "module", "package", "library", "framework", "architecture",
-                      "system", "application", "service", "component", "feature",
-                      "movie", "film", "character", "plot", "story", "director",
-                      "actor", "actress", "scene", "sequence", "theme", "genre",
-                      "cinema", "cinematic", "visual", "special effects", "soundtrack",
-                      "score", "editing", "cinematography", "production", "director",
-                      "writer", "screenplay", "script", "dialogue", "monologue",
-                      "performance", "acting", "role", "character", "protagonist",
-                      "antagonist", "supporting", "cast", "crew", "production",
-                      "budget", "box office", "revenue", "release", "premiere",
-                      "theater", "cinema", "audience", "review", "critic",
-                      "rating", "award", "nomination", "academy", "oscar",
-                      "golden globe", "bafta", "cannes", "venice", "berlin",
-                      "sundance", "tribeca", "independent", "studio", "production",
-                      "company", "distributor", "marketing", "promotion", "trailer",
-                      "teaser", "poster", "artwork", "design", "concept",
-                      "development", "pre-production", "production", "post-production",
-                      "editing", "sound", "music", "visual effects", "special effects",
-                      "stunts", "action", "drama", "comedy", "thriller", "horror",
-                      "sci-fi", "fantasy", "romance", "documentary", "animation",
-                      "live action", "3D", "IMAX", "format", "resolution",
-                      "aspect ratio", "soundtrack", "score", "song", "music",
-                      "sound design", "mixing", "editing", "color", "grading",
-                      "visual effects", "special effects", "stunts", "action",
-                      "drama", "comedy", "thriller", "horror", "sci-fi", "fantasy",
-                      "romance", "documentary", "animation", "live action", "3D",
-                      "IMAX", "format", "resolution", "aspect ratio", "soundtrack",
-                      "score", "song", "music", "sound design", "mixing", "editing",
-                      "color", "grading", "visual effects", "special effects",
-                      "stunts", "action", "drama", "comedy", "thriller", "horror",
-                      "sci-fi", "fantasy", "romance", "documentary", "animation",
-                      "live action", "3D", "IMAX", "format", "resolution",
-                      "aspect ratio", "soundtrack", "score", "song", "music",
-                      "sound design", "mixing", "editing", "color", "grading"]
-    has_technical_terms = any(term in response_lower for term in technical_terms)
-    
     # A response is considered factual if it contains fact keywords or technical terms
     # AND is not too long (to avoid storing full conversations)
-    is_concise = len(response.split()) <= 100  # Increased word limit
+    if len(response.split()) > 100:  # Increased word limit
+        return False
     
-    return (has_fact_keywords or has_technical_terms) and is_concise
+    return _FACT_MATCHER.search(response.lower()) is not None
+
+def classify_facts(responses):
+    """Run is_fact_response over many responses in one call."""
+    search = _FACT_MATCHER.search
+    return [len(response.split()) <= 100 and search(response.lower()) is not None
+            for response in responses]
 
 def extract_context(user_input: str, ai_response: str) -> str:
     """Extract meaningful context from the conversation using sophisticated pattern matching."""
-    # Combine user input and AI response for analysis
-    combined = f"{user_input} {ai_response}".lower()
-    
-    # Define context categories with their patterns
-    context_patterns = {
-        "Technical Fact": [
-            # Technical definitions
-            r"(?:it|this|that|they|he|she)\s+(?:is|are|was|were|means|refers to)\s+(?:a|an|the)?\s*([^.!?]+(?:system|architecture|framework|technology|method|process)[^.!?]+[.!?])",
-            # Technical characteristics
-            r"(?:the|a|an)\s+([^.!?]+(?:is|are|was|were)\s+(?:used for|designed to|implemented as|configured to)[^.!?]+[.!?])",
-            # Technical relationships
-            r"(?:it|this|that|they|he|she)\s+(?:connects|integrates|interacts|communicates)\s+(?:with|to|through)\s+([^.!?]+[.!?])"
-        ],
-        "Project Context": [
-            # Project structure
-            r"(?:the|this|that)\s+(?:project|system|application)\s+(?:has|contains|includes|consists of)\s+([^.!?]+[.!?])",
-            # Project requirements
-            r"(?:we|they|he|she)\s+(?:need|require|must have)\s+([^.!?]+[.!?])",
-            # Project constraints
-            r"(?:the|this|that)\s+(?:project|system|application)\s+(?:must|should|needs to)\s+([^.!?]+[.!?])"
-        ]
-    }
-    
-    # Try each pattern type
-    for context_type, patterns in context_patterns.items():
-        for pattern in patterns:
-            matches = re.finditer(pattern, combined)
-            for match in matches:
-                context = match.group(1).strip()
-                # Validate context quality
-                if is_valid_context(context):
-                    return f"{context_type}: {context}"
-    
-    return None
-
-def is_valid_context(context: str) -> bool:
-    """Validate if the extracted context is meaningful and complete."""
-    # Check minimum length (at least 3 words)
-    if len(context.split()) < 3:
-        return False
+    return _extractor.extract(user_input, ai_response)
+
+def classify_turn(user_input, ai_response):
+    """(category, fact) for a turn worth remembering, or None."""
+    # The keyword check is cheap and rejects most turns before extraction
+    if not is_fact_response(ai_response):
+        return None
+    return _split_context(extract_context(user_input, ai_response))
+
+def _split_context(context):
+    """(category, fact) of an extracted context string, or None."""
+    if context is None:
+        return None
+    category, _, fact = context.partition(": ")
+    return category, fact
+
+def fact_pipeline():
+    """Return the background fact classification pipeline, starting it on first use."""
+    global _facts, _fact_writes
+    if _facts is None:
+        with _facts_lock:
+            if _facts is None:
+                # A fact already stored under the same content hash is refreshed
+                _fact_writes = WriteBehindQueue(_db(), """
+                    INSERT INTO facts (id, role, content, source_session, category, timestamp, content_hash) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (content_hash) DO UPDATE SET timestamp = excluded.timestamp
+                """, on_error=_report_write_error)
+                _facts = FactPipeline(classify_turn, _fact_writes, workers=FACT_WORKERS,
+                                      max_queue=FACT_QUEUE_SIZE, on_fact=_track_fact)
+    return _facts
+
+def _track_fact(row):
+    """Make a classified fact retrievable and count it against the facts table's limits."""
+    fact_index().add([row[0]], [row[2]])
+    store = fact_stores()["facts"]
+    # Extracted facts passed both classifiers; a repeat counts as an access
+    store.add(row[6], len(row[2].encode("utf-8")), 1.0, last=time.time())
+    if store.over_limit():
+        enforce_fact_limits()
+
+def fact_confidence(content):
+    """How sure the classifiers are that content is worth keeping, in (0, 1]."""
+    if _extractor.extract("", content) is not None:
+        return 1.0
+    if is_fact_response(content):
+        return 0.6
+    return 0.3
+
+def fact_stores():
+    """
+    Importance bookkeeping of the context facts and the facts table.
+
+    Loaded from the database on first use; facts without a stored
+    confidence are scored by fact_confidence() once.
+    """
+    global _stores
+    if _stores is None:
+        with _stores_lock:
+            if _stores is None:
+                stores = {}
+                for table, where in queries.FACT_ROWS.items():
+                    store = ImportanceHeap(FACT_MAX_COUNT, FACT_MAX_BYTES, FACT_HALF_LIFE_DAYS * 86400)
+                    rows = _db().query(f"""
+                        SELECT content_hash, length(CAST(content AS BLOB)), weight, 
+                               COALESCE(last_access, (julianday(timestamp) - 2440587.5) * 86400.0), 
+                               confidence, CASE WHEN confidence IS NULL THEN content END 
+                        FROM {table} 
+                        WHERE {where}
+                    """)
+                    for digest, size, weight, last, confidence, content in rows:
+                        if confidence is None:
+                            store.add(digest, size or 0, fact_confidence(content or ""), weight or 1.0, last or 0.0)
+                        else:
+                            store.add(digest, size or 0, confidence, weight or 1.0, last or 0.0, dirty=False)
+                    stores[table] = store
+                _stores = stores
+    return _stores
+
+def enforce_fact_limits():
+    """
+    Evict the least important facts from every store over its limits.
+
+    Evictions are local and are not journaled. Also saves the access
+    counts and confidences gathered since the last call. Returns the
+    number of facts evicted.
+    """
+    if not _evict_lock.acquire(blocking=False):
+        return 0  # Another thread is already evicting
+    try:
+        flush_writes()
+        if _fact_writes is not None:
+            _fact_writes.flush()
+        
+        evicted = 0
+        for table, store in fact_stores().items():
+            where = queries.FACT_ROWS[table]
+            hashes = store.evict(FACT_LOW_WATER)
+            with _db().writer() as conn:
+                conn.executemany(queries.FACT_ACCESS_UPDATE.format(table=table, where=where),
+                                 store.take_dirty())
+                lookup = queries.EVICT_LOOKUP.format(table=table, where=where)
+                ids = [_id for digest in hashes for (_id,) in conn.execute(lookup, (digest,))]
+                conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(_id,) for _id in ids])
+            # Capacity is a local policy: no tombstones, so the shared memory
+            # and the other machines keep these facts
+            for _id in ids:
+                fact_index().remove(_id)
+            evicted += len(hashes)
+        return evicted
+    finally:
+        _evict_lock.release()
+
+def fact_store_stats():
+    """Size, limits and eviction counts of each fact store, None before they load."""
+    if _stores is None:
+        return None
+    return {table: store.stats() for table, store in _stores.items()}
+
+def list_facts(limit=50):
+    """The newest classified facts as dicts with their category and source session."""
+    if _fact_writes is not None:
+        _fact_writes.flush()
+    rows = _db().query(queries.LIST_FACTS, (limit,))
+    return [{"id": _id, "content": content, "category": category, "session_id": session}
+            for _id, content, category, session in rows]
+
+def fact_pipeline_stats():
+    """Queue depth and counters of the fact pipeline, None if it has not started."""
+    return _facts.stats() if _facts is not None else None
+
+def backfill_facts():
+    """
+    Classify every stored turn into the facts table.
+
+    Turns are paired per session in time order and classified here in
+    batches, the same way the pipeline classifies a single turn; the facts
+    found are stored through the pipeline. Returns the number of turns
+    classified.
+    """
+    wait_until_ready()
+    flush_writes()
+    pipeline = fact_pipeline()
+    classified = 0
+    with _db().reader() as conn:
+        rows = conn.execute(queries.BACKFILL_TURNS)
+        for session_id, messages in groupby(rows, key=lambda row: row[0]):
+            turns = list(iter_turns({"role": role, "content": content} for _, role, content in messages))
+            # The keyword check rejects most turns before extraction
+            worth = [turn for turn in turns if is_fact_response(turn[1])]
+            with span("fact_classify"):
+                contexts = list(_extractor.extract_many(worth))
+            for context in contexts:
+                pipeline.record(session_id, _split_context(context))
+            for _ in range(len(turns) - len(worth)):
+                pipeline.record(session_id, None)
+            classified += len(turns)
+    _fact_writes.flush()
+    enforce_fact_limits()
+    return classified
+
+def _complete_summary(instructions, text):
+    """Ask the model for a summary; the summarizer's completion function."""
+    with span("llm_summarize"):
+        response = get_client().chat.completions.create(
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": text},
+            ],
+            model=MODEL,
+            temperature=0.0,
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+    return response.choices[0].message.content
+
+def summarizer():
+    """Return the session summarizer, creating it on first use."""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = Summarizer(_complete_summary, max_input_tokens=DEFAULT_TOKEN_BUDGET,
+                                 max_summary_tokens=SUMMARY_MAX_TOKENS)
+    return _summarizer
+
+def session_summary(session_id=None):
+    """The rolling summary of a session's folded turns, or None."""
+    row = _db().query_one(queries.SESSION_SUMMARY, (session_id or _session_id,))
+    return row[1] if row else None
+
+def summarize_session(session_id, keep_recent=0, min_tokens=0):
+    """
+    Fold a session's older turns into its rolling summary.
+
+    All but the newest keep_recent messages are summarized together with
+    the session's current summary, which is updated in place, and are then
+    moved from the context table to the archive; facts are never folded. A
+    session with no summary yet is left alone while its turns total under
+    min_tokens.
+    Returns the number of messages folded.
+    """
+    flush_writes()
+    rows = _db().query("""
+        SELECT id, role, content, timestamp 
+        FROM context 
+        WHERE is_fact = 0 AND session_id = ? 
+        ORDER BY timestamp
+    """, (session_id,))
+    rows = rows[:max(len(rows) - keep_recent, 0)]
+    if not rows:
+        return 0
     
-    # Check for proper sentence ending
-    if not context.endswith(('.', '!', '?')):
-        return False
+    current = _db().query_one(queries.SESSION_SUMMARY, (session_id,))
+    if current is None and sum(estimate_tokens(row[2]) for row in rows) < min_tokens:
+        return 0
     
-    # Check for common meaningless patterns
-    meaningless_patterns = [
-        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s+(?:a|an|the)\s*$",
-        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:am|is|are|was|were)\s*$",
-        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:have|has|had)\s*$",
-        r"^\s*(?:i|you|he|she|they|it|this|that|these|those)\s+(?:want|need|like|love)\s*$"
-    ]
-    
-    for pattern in meaningless_patterns:
-        if re.match(pattern, context, re.IGNORECASE):
-            return False
-    
-    # Check for minimum information content
-    # Count significant words (excluding common words)
-    common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-    words = set(context.lower().split())
-    significant_words = words - common_words
-    
-    if len(significant_words) < 2:
-        return False
+    messages = [{"role": role, "content": content} for _, role, content, _ in rows]
+    content = summarizer().fold(current[1] if current else None, messages)
+    if _summary_closing.is_set():
+        # shutdown() stopped waiting; the turns stay unfolded
+        return 0
+    archive = session_archive()
+    ids = [row[0] for row in rows]
+    
+    with _archive_lock, _db().writer() as conn:
+        # A /reset that stopped waiting for this fold may have archived or
+        # cleared the turns meanwhile; then they are not folded twice
+        placeholders = ", ".join("?" * len(ids))
+        left = conn.execute(f"SELECT COUNT(*) FROM context WHERE id IN ({placeholders})", ids).fetchone()[0]
+        if left != len(ids):
+            return 0
+        if current:
+            summary_id = current[0]
+            conn.execute("""
+                UPDATE summaries 
+                SET content = ?, messages = messages + ?, last_time = ? 
+                WHERE id = ?
+            """, (content, len(rows), rows[-1][3], summary_id))
+        else:
+            summary_id = str(uuid.uuid4())
+            conn.execute("""
+                INSERT INTO summaries (id, session_id, level, content, messages, first_time, last_time) 
+                VALUES (?, ?, 0, ?, ?, ?, ?)
+            """, (summary_id, session_id, content, len(rows), rows[0][3], rows[-1][3]))
+            conn.execute("UPDATE sessions SET summary_id = ? WHERE id = ?", (summary_id, session_id))
+        archive.add(conn, session_id, rows)
+        conn.executemany("DELETE FROM context WHERE id = ?", [(_id,) for _id in ids])
     
-    return True
+    # The shards get the summary and drop the turns it replaces
+    journal().append({"id": summary_id, "role": "summary", "level": 0, "content": content,
+                      "timestamp": rows[-1][3]})
+    _tombstone(ids)
+    return len(rows)
 
-def query_llama(prompt):
-    """Process user query and maintain session context."""
-    try:
-        # Add user message to context
-        add_message("user", prompt)
-        
-        # Get stored context
-        messages = get_messages()
-        
-        # Prepare conversation history with system message
-        conversation = [
-            {
-                "role": "system",
-                "content": "You are a concise assistant. Keep responses brief and to the point. Use short sentences and avoid unnecessary details."
-            }
-        ]
+def merge_summaries(fanout=SUMMARY_FANOUT):
+    """
+    Build summaries of summaries.
+
+    Whenever fanout summaries of one level are not yet part of a higher
+    one, the oldest fanout of them are merged into a summary one level up,
+    and so on up the hierarchy. Summaries of open sessions are left alone.
+    Returns the number of summaries created.
+    """
+    created = 0
+    level = 0
+    while True:
+        rows = _db().query(queries.OPEN_SUMMARIES, (level, fanout))
+        if len(rows) == fanout:
+            content = summarizer().merge([row[1] for row in rows])
+            if _summary_closing.is_set():
+                return created
+            parent_id = str(uuid.uuid4())
+            with _db().writer() as conn:
+                conn.execute("""
+                    INSERT INTO summaries (id, level, content, messages, first_time, last_time) 
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (parent_id, level + 1, content, sum(row[2] or 0 for row in rows),
+                      rows[0][3], rows[-1][4]))
+                conn.executemany("UPDATE summaries SET parent_id = ? WHERE id = ?",
+                                 [(parent_id, row[0]) for row in rows])
+            journal().append({"id": parent_id, "role": "summary", "level": level + 1, "content": content,
+                              "timestamp": rows[-1][4], "children": [row[0] for row in rows]})
+            created += 1
+            continue
         
-        # Add conversation history
-        for msg in messages:
-            conversation.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        top = _db().query_one("SELECT MAX(level) FROM summaries WHERE parent_id IS NULL")[0]
+        if top is None or level >= top:
+            return created
+        level += 1
+
+def _run_summary(key):
+    session_id, final = key
+    try:
+        if final:
+            summarize_session(session_id, min_tokens=SUMMARY_MIN_TOKENS)
+            if not _summary_closing.is_set():
+                merge_summaries()
+                archive_session(session_id)
+        else:
+            summarize_session(session_id, keep_recent=SUMMARY_KEEP_RECENT)
+    except Exception as e:
+        console.print(f"[red]Failed to summarize session: {e}[/red]")
+    finally:
+        with _summary_lock:
+            _summary_pending.pop(key, None)
+
+def request_summary(session_id, final=False):
+    """
+    Queue a fold of session_id on the background summary worker.
+
+    A final fold takes every remaining turn of an ended session, merges
+    summaries up the hierarchy and archives what the fold left; otherwise
+    the newest turns stay verbatim. Returns the future of the fold, or of the same fold already
+    queued.
+    """
+    global _summary_jobs
+    key = (session_id, final)
+    with _summary_lock:
+        if key in _summary_pending:
+            return _summary_pending[key]
+        if _summary_jobs is None:
+            # One worker keeps folds of a session in order; it is a daemon
+            # thread so a fold waiting on the model never holds up the exit
+            _summary_jobs = queue.Queue()
+            threading.Thread(target=_summary_worker, args=(_summary_jobs,),
+                             name="summarize", daemon=True).start()
+        future = Future()
+        _summary_jobs.put((key, future))
+        _summary_pending[key] = future
+    return future
+
+def _summary_worker(jobs):
+    """Run queued folds in order until shutdown() queues None."""
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        key, future = job
+        if future.set_running_or_notify_cancel():
+            _run_summary(key)
+            future.set_result(None)
+
+def prior_summaries(session_id=None, limit=PRIOR_SUMMARIES):
+    """
+    Compact text standing in for earlier conversation, oldest first.
+
+    The newest top-level summaries of other sessions, followed by the
+    rolling summary of session_id's own folded turns.
+    """
+    session_id = session_id or _session_id
+    rows = _db().query(queries.PRIOR_SUMMARIES, (session_id, limit))
+    summaries = [content for (content,) in reversed(rows)]
+    own = session_summary(session_id)
+    if own:
+        summaries.append(own)
+    return summaries
+
+def session_archive():
+    """Return the compressed archive of ended sessions' turns."""
+    global _archive
+    if _archive is None:
+        archive = SessionArchive(_db(), ARCHIVE_PATH, level=ARCHIVE_LEVEL)
+        archive.setup()
+        _archive = archive
+    return _archive
+
+def archive_session(session_id):
+    """
+    Move an ended session's turns out of the hot tables into the archive.
+
+    Its facts stay in the context table for retrieval, and the journal and
+    shards keep the turns. Returns the number of messages moved.
+    """
+    flush_writes()
+    archive = session_archive()
+    with _archive_lock:
+        row = _db().query_one("SELECT end_time FROM sessions WHERE id = ?", (session_id,))
+        if row is None or row[0] is None:
+            return 0
+        rows = _db().query("""
+            SELECT id, role, content, timestamp 
+            FROM context 
+            WHERE is_fact = 0 AND session_id = ? 
+            ORDER BY timestamp
+        """, (session_id,))
         
+        # The archive commits before the hot rows go, so a crash in between
+        # leaves a copy in both rather than in neither
+        if rows:
+            with _db().writer() as conn:
+                archive.add(conn, session_id, rows)
+        with _db().writer() as conn:
+            conn.executemany("DELETE FROM context WHERE id = ?", [(row[0],) for row in rows])
+            conn.execute("UPDATE sessions SET archived = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+    return len(rows)
+
+def archive_ended_sessions():
+    """Archive every ended session not archived yet; returns the messages moved."""
+    rows = _db().query(queries.UNARCHIVED_SESSIONS)
+    return sum(archive_session(session_id) for (session_id,) in rows)
+
+def archived_sessions(limit=20, offset=0):
+    """Archived sessions, most recent first, with their sizes."""
+    return session_archive().sessions(limit, offset)
+
+def archived_messages(session_id):
+    """The archived turns of a session, decompressed on first read."""
+    return session_archive().messages(session_id)
+
+def search_archive(keyword, limit=20):
+    """Archived messages containing keyword, newest sessions first."""
+    return session_archive().search(keyword, limit)
+
+def archive_stats():
+    """Archive size before and after compression, and its file size."""
+    return session_archive().stats()
+
+def get_history(session_id=None):
+    """Get the non-fact conversation messages in order, optionally of one session."""
+    pending = [row for row in _pending_rows(session_id) if not row[3]]
+    if session_id is None:
+        rows = _db().query(queries.GET_HISTORY)
+    else:
+        rows = _db().query(queries.SESSION_HISTORY, (session_id,))
+    rows = _merge_pending(rows, pending)
+    return [{"id": _id, "role": role, "content": content} 
+            for _id, role, content, _ in rows]
+
+def relevant_facts(prompt, k=FACT_TOP_K):
+    """The k stored facts most similar to prompt, most relevant first."""
+    wait_until_ready()
+    ranked = [msg_id for msg_id, score in fact_index().search(prompt, k)
+              if score >= FACT_MIN_SCORE]
+    if not ranked:
+        return []
+    
+    # Ranked ids are stored facts or facts classified from turns
+    placeholders = ", ".join("?" * len(ranked))
+    rows = _db().query(f"""
+        SELECT id, role, content, 'context' FROM context WHERE id IN ({placeholders}) 
+        UNION ALL 
+        SELECT id, role, content, 'facts' FROM facts WHERE id IN ({placeholders})
+    """, ranked * 2)
+    pending = [(_id, role, content, "context") for _id, role, content, _ in _pending_rows()]
+    pending += [(_id, role, content, "facts") for _id, role, content in _pending_fact_rows()]
+    rows = _merge_pending(rows, [row for row in pending if row[0] in ranked])
+    tables = {row[0]: row[3] for row in rows}
+    by_id = {_id: {"id": _id, "role": role, "content": content} for _id, role, content, _ in rows}
+    
+    # Drop index entries whose fact was merged into an existing copy
+    for msg_id in ranked:
+        if msg_id not in by_id:
+            fact_index().remove(msg_id)
+    facts = [by_id[msg_id] for msg_id in ranked if msg_id in by_id]
+    
+    # Being retrieved into a prompt is what keeps a fact from eviction
+    now = time.time()
+    for table, store in fact_stores().items():
+        store.touch([content_hash(fact["role"], fact["content"])
+                     for fact in facts if tables[fact["id"]] == table], now)
+    return facts
+
+def _prepare_conversation(prompt, session_id=None):
+    """Store the user prompt and build the conversation sent to the model."""
+    session_id = session_id or _session_id
+    
+    # Add user message to context
+    add_message("user", prompt, session_id=session_id)
+    
+    # Get this session's conversation and the facts relevant to this prompt
+    history = get_history(session_id)
+    facts = relevant_facts(prompt)
+    
+    # Fold older turns into the session summary once the raw history grows
+    # too long; this prompt still sees them verbatim
+    if sum(estimate_tokens(msg["content"]) for msg in history) > SUMMARY_TRIGGER_TOKENS:
+        request_summary(session_id)
+    
+    # Pin summaries and facts and fit recent history into the token budget;
+    # the pinning keeps facts from the end of the list, so pass the most
+    # relevant last
+    return build_context(SYSTEM_PROMPT, history, list(reversed(facts)),
+                         summaries=prior_summaries(session_id))
+
+def answer(prompt, session_id=None):
+    """Reply to prompt within a session, storing both messages; raises on API errors."""
+    conversation = _prepare_conversation(prompt, session_id)
+    
+    # Reuse the reply to an identical deterministic request
+    key = _cached_reply_key(conversation)
+    reply = response_cache().get(key) if key else None
+    
+    if reply is None:
         # Get response from LLaMA with context
-        response = client.chat.completions.create(
-            messages=conversation,
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            max_tokens=256,  # Reduced from 1024 to 256
-        )
+        with span("llm_api"):
+            response = get_client().chat.completions.create(
+                messages=conversation,
+                model=MODEL,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+            )
         reply = response.choices[0].message.content
+        if key:
+            response_cache().put(key, reply)
+    
+    # Store AI response and look for facts in the turn off the reply path
+    add_message("assistant", reply, session_id=session_id)
+    fact_pipeline().submit(session_id or _session_id, prompt, reply)
+    return reply
+
+def query_llama(prompt, session_id=None):
+    """Process user query and maintain session context."""
+    try:
+        return answer(prompt, session_id)
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-        # Store AI response
-        add_message("assistant", reply)
+def query_llama_stream(prompt):
+    """
+    Process user query and yield the reply in chunks as the model streams it.
 
-        return reply
+    The assistant message is stored once the stream ends, including the
+    partial reply if the stream fails or the generator is closed early.
+    """
+    parts = []
+    complete = False
+    try:
+        conversation = _prepare_conversation(prompt)
+        
+        # A cached reply is yielded whole
+        key = _cached_reply_key(conversation)
+        cached = response_cache().get(key) if key else None
+        if cached is not None:
+            parts.append(cached)
+            yield cached
+            complete = True
+            return
+        
+        # Time to first token; the total includes the caller's rendering
+        start = time.perf_counter()
+        stream = get_client().chat.completions.create(
+            messages=conversation,
+            model=MODEL,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    record("llm_first_token", time.perf_counter() - start)
+                parts.append(delta)
+                yield delta
         
+        # Only complete replies are cached
+        complete = True
+        if key and parts:
+            response_cache().put(key, "".join(parts))
     except Exception as e:
-        return f"Error: {str(e)}"
+        prefix = "\n" if parts else ""
+        yield f"{prefix}Error: {str(e)}"
+    finally:
+        # Store AI response, partial or not; only complete ones are classified
+        if parts:
+            add_message("assistant", "".join(parts))
+        if complete and parts:
+            fact_pipeline().submit(_session_id, prompt, "".join(parts))
 
 def delete_memory_by_id(msg_id):
     """Delete a specific message from the session."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Check if it's a fact
-    cursor.execute("SELECT is_fact FROM context WHERE id = ?", (msg_id,))
-    result = cursor.fetchone()
-    if result and result[0]:
-        # Remove from facts table
-        cursor.execute("DELETE FROM facts WHERE id = ?", (msg_id,))
+    wait_until_ready()
+    flush_writes()
+    fact_index().remove(msg_id)
     
-    # Remove from context
-    cursor.execute("DELETE FROM context WHERE id = ?", (msg_id,))
-    conn.commit()
-    conn.close()
+    with _db().writer() as conn:
+        # Check if it's a fact
+        result = conn.execute(queries.MESSAGE_BY_ID, (msg_id,)).fetchone()
+        if result and result[0] and _stores is not None:
+            _stores["context"].remove(result[1])
+        
+        # Or a classified fact listed by /facts
+        fact = conn.execute("SELECT content_hash FROM facts WHERE id = ?", (msg_id,)).fetchone()
+        if fact:
+            conn.execute("DELETE FROM facts WHERE id = ?", (msg_id,))
+            if _stores is not None:
+                _stores["facts"].remove(fact[0])
+        
+        # Remove from context
+        conn.execute("DELETE FROM context WHERE id = ?", (msg_id,))
+    _tombstone([msg_id])
     
     console.print(f"[green]Deleted message with ID {msg_id}[/green]")
 
+def merge_near_duplicate_facts(threshold=0.8):
+    """Merge near-identical facts, keeping the newest of each group."""
+    wait_until_ready()
+    flush_writes()
+    
+    rows = _db().query("""
+        SELECT id, content, timestamp, content_hash 
+        FROM context 
+        WHERE is_fact = 1
+    """)
+    timestamps = {_id: timestamp for _id, _, timestamp, _ in rows}
+    hashes = {_id: digest for _id, _, _, digest in rows}
+    groups = find_near_duplicates(((_id, content) for _id, content, _, _ in rows), threshold)
+    
+    removed = []
+    for group in groups:
+        group.sort(key=lambda _id: (timestamps[_id] or "", _id))
+        removed.extend(group[:-1])
+    if not removed:
+        return 0
+    
+    _db().executemany("DELETE FROM context WHERE id = ?", [(_id,) for _id in removed])
+    _tombstone(removed)
+    for _id in removed:
+        fact_index().remove(_id)
+        if _stores is not None:
+            _stores["context"].remove(hashes[_id])
+    return len(removed)
+
+def delete_all_memory():
+    """Delete every stored message, fact and summary, archived turns included."""
+    wait_until_ready()
+    flush_writes()
+    archive = session_archive()
+    
+    with _db().writer() as conn:
+        ids = [_id for (_id,) in conn.execute("SELECT id FROM context UNION ALL SELECT id FROM summaries")]
+        conn.execute("DELETE FROM context")
+        conn.execute("DELETE FROM facts")
+        conn.execute("UPDATE sessions SET summary_id = NULL")
+        conn.execute("DELETE FROM summaries")
+        archive.clear(conn)
+    fact_index().clear()
+    if _stores is not None:
+        for store in _stores.values():
+            store.clear()
+    
+    # Shards are never rewritten; tombstones delete the memory everywhere
+    _tombstone(ids)
+
 def show_memory():
     """
     Show all messages with IDs in console.
@@ -457,17 +1402,85 @@ def show_memory():
     for i, msg in enumerate(messages, 1):
         console.print(f"[bold]{i}. [ID: {msg['id']}] [{msg['role'].upper()}][/bold] {msg['content']}")
 
-def tag_filter(keyword):
+def iter_memory_page(after=None, before=None, limit=MEMORY_PAGE_SIZE, inclusive=False):
     """
-    Filter messages by keyword in content (case-insensitive).
+    Yield one page of stored messages, oldest first, straight from the cursor.
+
+    Rows are (id, role, content, is_fact, timestamp) and pages are keyed on
+    (timestamp, id): after=key starts just past key (at it when inclusive),
+    before=key ends just before it, and with neither the newest page is
+    returned.
     """
-    messages = get_messages()
-    matched = [m for m in messages if keyword.lower() in m["content"].lower()]
+    flush_writes()
+    with _db().reader() as conn:
+        if after is not None:
+            page = queries.MEMORY_FROM if inclusive else queries.MEMORY_NEXT
+            yield from conn.execute(page, (*after, limit))
+            return
+        
+        # Walk backwards from the end or from before, then restore time order
+        if before is None:
+            rows = conn.execute(queries.MEMORY_LATEST, (limit,)).fetchall()
+        else:
+            rows = conn.execute(queries.MEMORY_PREV, (*before, limit)).fetchall()
+        yield from reversed(rows)
+
+def memory_key(msg_id):
+    """The (timestamp, id) page key of a stored message, or None."""
+    flush_writes()
+    row = _db().query_one("SELECT timestamp, id FROM context WHERE id = ?", (msg_id,))
+    return tuple(row) if row else None
+
+# Markers placed around matches by snippet(); replaced after escaping
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+def _fts_query(keyword):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = keyword.split()
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+def search_messages(keyword, limit=20, offset=0):
+    """Ranked full-text search over stored messages and facts."""
+    query = _fts_query(keyword)
+    if not query:
+        return []
+    
+    # Make queued messages searchable
+    flush_writes()
+    
+    rows = _db().query(f"""
+        SELECT id, role, source, snippet FROM (
+            SELECT c.id, c.role, 'message' AS source,
+                   snippet(context_fts, 0, '{_MATCH_START}', '{_MATCH_END}', '...', 16) AS snippet,
+                   bm25(context_fts) AS rank
+            FROM context_fts JOIN context c ON c.rowid = context_fts.rowid
+            WHERE context_fts MATCH ?
+            UNION ALL
+            SELECT f.id, f.role, 'fact' AS source,
+                   snippet(facts_fts, 0, '{_MATCH_START}', '{_MATCH_END}', '...', 16) AS snippet,
+                   bm25(facts_fts) AS rank
+            FROM facts_fts JOIN facts f ON f.rowid = facts_fts.rowid
+            WHERE facts_fts MATCH ?
+        )
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """, (query, query, limit, offset))
+    return [{"id": _id, "role": role, "source": source, "snippet": snippet}
+            for _id, role, source, snippet in rows]
+
+def tag_filter(keyword, limit=20, offset=0):
+    """
+    Show messages matching keyword, best matches first.
+    """
+    matched = search_messages(keyword, limit, offset)
     if not matched:
-        console.print(f"[italic]No messages containing: '{keyword}'[/italic]")
-        return
-    for i, msg in enumerate(matched, 1):
-        console.print(f"[bold]{i}. [ID: {msg['id']}] [{msg['role'].upper()}][/bold] {msg['content']}")
+        console.print(f"[italic]No messages containing: '{escape(keyword)}'[/italic]")
+        return matched
+    for i, msg in enumerate(matched, offset + 1):
+        snippet = escape(msg["snippet"]).replace(_MATCH_START, "[bold yellow]").replace(_MATCH_END, "[/bold yellow]")
+        console.print(f"[bold]{i}. [ID: {msg['id']}] [{msg['role'].upper()}][/bold] {snippet}")
+    return matched
 
 def print_help():
     """
@@ -483,52 +1496,18 @@ def print_help():
     console.print(help_text)
 
 def exit_session():
-    """Exit the session and push all messages to GitHub."""
-    try:
-        # Get all messages from the database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, role, content 
-            FROM context 
-            ORDER BY timestamp DESC
-        """)
-        messages = [{"id": _id, "role": role, "content": content} 
-                for _id, role, content in cursor.fetchall()]
-        conn.close()
-        
-        if not messages:
-            console.print("[yellow]No messages to save.[/yellow]")
-            return
-        
-        console.print(f"[green]Saving {len(messages)} messages to GitHub...[/green]")
-        
-        # Save messages to JSON
-        with open(JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(messages, f, indent=2)
-        
-        # Push to GitHub
-        try:
-            # Add the file
-            subprocess.run(["git", "add", JSON_PATH], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-            # Commit with timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            commit_msg = f"Update conversation - {timestamp}"
-            subprocess.run(["git", "commit", "-m", commit_msg], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-            # Push changes
-            subprocess.run(["git", "push"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    """Exit the session and push all messages to GitHub, waiting a bounded time."""
+    # Summarize this session first so the snapshot carries the summary
+    end_session(_session_id, wait=True, timeout=SUMMARY_EXIT_TIMEOUT)
+    count = save_session_to_github()
+    if _sync is None:
+        return
+    
+    if count:
+        console.print(f"[green]Saving {count} messages to GitHub...[/green]")
+    if git_sync().flush(SYNC_EXIT_TIMEOUT):
+        if count:
             console.print("[green]Successfully saved conversation to GitHub[/green]")
-            
-        except subprocess.CalledProcessError as e:
-            console.print(f"[red]Failed to push to GitHub: {e}[/red]")
-            # If push fails, try to pull first and then push again
-            try:
-                subprocess.run(["git", "pull", "--rebase"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                subprocess.run(["git", "push"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                console.print("[green]Successfully saved conversation to GitHub after resolving conflicts[/green]")
-            except subprocess.CalledProcessError as e2:
-                console.print(f"[red]Failed to resolve GitHub conflicts: {e2}[/red]")
-    except Exception as e:
-        console.print(f"[red]Error saving to GitHub: {e}[/red]")
+    else:
+        error = git_sync().status()["last_error"] or "timed out"
+        console.print(f"[red]Failed to push to GitHub: {error}[/red]")
@@ -1,19 +1,30 @@
 from logic import (
-    init_db, query_llama, get_messages, get_facts,
-    save_session_to_github, pull_json_from_github,
-    delete_memory_by_id, clear_session, DB_PATH
+    init_db, query_llama, query_llama_stream, get_messages, get_facts,
+    save_session_to_github, pull_json_from_github, exit_session, request_sync, sync_status,
+    delete_memory_by_id, delete_all_memory, clear_session, shutdown, tag_filter,
+    merge_near_duplicate_facts, cache_stats, clear_cache, api_stats, iter_memory_page, memory_key,
+    list_facts, backfill_facts, fact_pipeline_stats, fact_store_stats, archived_sessions,
+    archived_messages, search_archive, archive_stats, DB_PATH
 )
-import sqlite3
+import logic
+import metrics
 import os
 import atexit
+import argparse
+from contextlib import closing
 from rich.console import Console
+from rich.live import Live
+from rich.markup import escape
 from rich.panel import Panel
+from rich.table import Table
 from rich.text import Text
 import json
-import subprocess
 
 console = Console()
 
+# Results shown per /search page
+SEARCH_PAGE_SIZE = 10
+
 ASCII_ART = """
 
                                                 ███╗   ███╗ ██████╗██████╗     ███████╗██╗███╗   ███╗
@@ -26,36 +37,90 @@ ASCII_ART = """
 """
 
 def print_facts():
-    """Show only factual messages from the current session."""
-    facts = get_facts()
+    """Show the newest facts classified from conversations."""
+    facts = list_facts()
     if not facts:
-        console.print("[yellow]No facts available in this session.[/yellow]")
-        return
-    console.print("[bold blue]Current Facts:[/bold blue]")
-    for i, msg in enumerate(facts, 1):
-        role = "👤" if msg["role"] == "user" else "🤖"
-        console.print(f"{i}. {role} {msg['content']} [ID: {msg['id']}]")
-
-def print_session():
-    """Show all messages from the current session."""
-    messages = get_messages()
-    if not messages:
-        console.print(Panel("No messages in this session.", style="yellow italic"))
+        console.print("[yellow]No facts extracted yet. Use /facts backfill to classify stored turns.[/yellow]")
         return
-    
+    console.print("[bold blue]Extracted Facts:[/bold blue]")
+    for i, fact in enumerate(facts, 1):
+        console.print(f"{i}. [cyan]{escape(fact['category'] or 'Fact')}[/cyan] {escape(fact['content'])} "
+                      f"[dim][ID: {fact['id']}][/dim]")
+
+def print_memory_page(rows):
+    """
+    Render one page of memory rows; returns the page's first and last keys.
+
+    Returns None, printing nothing, when the page is empty.
+    """
     session_text = Text()
-    session_text.append("Current Session Messages:\n\n", style="bold blue")
-    
-    for i, msg in enumerate(messages, 1):
-        role = "👤" if msg["role"] == "user" else "🤖"
-        fact_marker = "📚" if msg.get("is_fact") else ""
-        session_text.append(f"{i}. ", style="bold green")
-        session_text.append(f"{role} ", style="bold cyan")
-        session_text.append(f"{msg['content']} ", style="white")
+    first = last = None
+    for _id, role, content, is_fact, timestamp in rows:
+        if first is None:
+            first = (timestamp, _id)
+        last = (timestamp, _id)
+        role_icon = "👤" if role == "user" else "🤖"
+        fact_marker = "📚" if is_fact else ""
+        session_text.append(f"{timestamp} ", style="bold green")
+        session_text.append(f"{role_icon} ", style="bold cyan")
+        session_text.append(f"{content} ", style="white")
         session_text.append(f"{fact_marker} ", style="yellow")
-        session_text.append(f"[ID: {msg['id']}]\n", style="dim")
+        session_text.append(f"[ID: {_id}]\n", style="dim")
+    if first is None:
+        return None
     
+    session_text.append("\n/memory prev · /memory next · /memory <id>", style="dim italic")
     console.print(Panel(session_text, title="Session History", border_style="blue"))
+    return first, last
+
+def archive_caption(stats):
+    """One line on how much the archive saves on disk."""
+    saved = stats["saved_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0
+    return (f"Archive: {stats['sessions']} sessions, {stats['messages']} messages  "
+            f"{stats['raw_bytes'] / 1e6:.2f} MB -> {stats['stored_bytes'] / 1e6:.2f} MB ({saved:.0%} saved)  "
+            f"File: {stats['file_bytes'] / 1e6:.2f} MB")
+
+def print_archive():
+    """List the archived sessions with their compressed sizes."""
+    sessions = archived_sessions()
+    if not sessions:
+        console.print("[yellow]No archived sessions yet; sessions move here once they end.[/yellow]")
+        return
+    table = Table(border_style="blue")
+    table.add_column("Session", style="dim")
+    table.add_column("Last message", style="bold green")
+    for column in ("Messages", "Raw KB", "Stored KB"):
+        table.add_column(column, justify="right")
+    for session in sessions:
+        table.add_row(session["session_id"], session["last_time"], str(session["messages"]),
+                      f"{session['raw_bytes'] / 1e3:.1f}", f"{session['stored_bytes'] / 1e3:.1f}")
+    table.caption = archive_caption(archive_stats()) + "\n/archive <session_id> · /archive search <keyword>"
+    console.print(Panel(table, title="Archived Sessions", border_style="blue"))
+
+def print_archived_session(session_id):
+    """Show the turns of one archived session."""
+    messages = archived_messages(session_id)
+    if not messages:
+        console.print(f"[red]No archived session with ID {escape(session_id)}.[/red]")
+        return
+    session_text = Text()
+    for msg in messages:
+        role_icon = "👤" if msg["role"] == "user" else "🤖"
+        session_text.append(f"{msg['timestamp']} ", style="bold green")
+        session_text.append(f"{role_icon} ", style="bold cyan")
+        session_text.append(f"{msg['content']}\n", style="white")
+    console.print(Panel(session_text, title=f"Archived Session {session_id}", border_style="blue"))
+
+def print_archive_search(keyword):
+    """Show archived messages containing keyword."""
+    with console.status("Searching the archive..."):
+        matches = search_archive(keyword, SEARCH_PAGE_SIZE)
+    if not matches:
+        console.print(f"[italic]No archived messages containing: '{escape(keyword)}'[/italic]")
+        return
+    for i, msg in enumerate(matches, 1):
+        console.print(f"[bold]{i}. [{msg['role'].upper()}][/bold] {escape(msg['content'])} "
+                      f"[dim][Session: {msg['session_id']}][/dim]")
 
 def end_session():
     """Save facts to GitHub and clear session."""
@@ -73,7 +138,23 @@ def print_help():
     help_text.append(" - Show this help menu\n")
     help_text.append("• ", style="bold green")
     help_text.append("/memory", style="bold yellow")
-    help_text.append(" - Show stored memory messages\n")
+    help_text.append(" - Show the latest page of stored messages\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/memory next, /memory prev", style="bold yellow")
+    help_text.append(" - Page through newer or older messages\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/memory <message_id>", style="bold yellow")
+    help_text.append(" - Jump to the page starting at a message\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/search <keyword>", style="bold yellow")
+    help_text.append(" - Search stored messages and facts\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/archive", style="bold yellow")
+    help_text.append(" - List ended sessions in the compressed archive "
+                     "(/archive <session_id> to read one, /archive search <keyword>)\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/search more", style="bold yellow")
+    help_text.append(" - Show the next page of search results\n")
     help_text.append("• ", style="bold green")
     help_text.append("/delete <message_id>", style="bold yellow")
     help_text.append(" - Delete a specific memory message\n")
@@ -81,6 +162,21 @@ def print_help():
     help_text.append("/delete all", style="bold yellow")
     help_text.append(" - Delete all stored memory\n")
     help_text.append("• ", style="bold green")
+    help_text.append("/facts", style="bold yellow")
+    help_text.append(" - Show facts extracted from conversations (/facts backfill to classify stored turns)\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/dedupe", style="bold yellow")
+    help_text.append(" - Merge near-duplicate facts\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/sync", style="bold yellow")
+    help_text.append(" - Show GitHub sync status\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/cache", style="bold yellow")
+    help_text.append(" - Show response cache statistics (/cache clear to empty it)\n")
+    help_text.append("• ", style="bold green")
+    help_text.append("/stats", style="bold yellow")
+    help_text.append(" - Show latency percentiles (/stats export to write them to files)\n")
+    help_text.append("• ", style="bold green")
     help_text.append("/reset", style="bold yellow")
     help_text.append(" - Clear current session and start fresh\n")
     help_text.append("• ", style="bold green")
@@ -89,7 +185,96 @@ def print_help():
     
     console.print(Panel(help_text, title="Help Menu", border_style="cyan"))
 
-def main():
+def print_sync_status():
+    """Show the state of the background GitHub sync."""
+    status = sync_status()
+    sync_text = Text()
+    if status["syncing"]:
+        sync_text.append("Syncing with GitHub...\n", style="bold cyan")
+    elif status["dirty"] or status["push_pending"]:
+        sync_text.append("Changes waiting to be pushed\n", style="bold yellow")
+    else:
+        sync_text.append("Up to date\n", style="bold green")
+    sync_text.append(f"Commits: {status['commits']}  Pushes: {status['pushes']}\n")
+    sync_text.append(f"Last commit: {status['last_commit'] or 'never'}\n")
+    sync_text.append(f"Last push: {status['last_push'] or 'never'}")
+    if status["failures"]:
+        retry = "" if status["retry_in"] is None else f", retrying in {status['retry_in']:.0f}s"
+        sync_text.append(f"\nFailed pushes: {status['failures']}{retry}", style="red")
+    if status["last_error"]:
+        sync_text.append(f"\nLast error: {status['last_error']}", style="red")
+    console.print(Panel(sync_text, title="GitHub Sync", border_style="cyan"))
+
+def print_cache_stats():
+    """Show the LLM response cache counters."""
+    stats = cache_stats()
+    cache_text = Text()
+    if logic.TEMPERATURE != 0 and not logic.LLM_CACHE_ALWAYS:
+        cache_text.append("Caching is off; run with --deterministic to enable it\n", style="yellow")
+    cache_text.append(f"Entries: {stats['entries']}\n")
+    cache_text.append(f"Hits: {stats['hits']} ({stats['memory_hits']} from memory)  Misses: {stats['misses']}\n")
+    cache_text.append(f"Hit rate: {stats['hit_rate']:.0%}  Evictions: {stats['evictions']}")
+    console.print(Panel(cache_text, title="Response Cache", border_style="cyan"))
+
+def print_stats():
+    """Show latency percentiles of the instrumented operations."""
+    summaries = metrics.stats()
+    if not summaries:
+        message = "No timings recorded yet." if metrics.enabled else "Timing is disabled (MCP_METRICS=0)."
+        console.print(f"[yellow]{message}[/yellow]")
+        return
+    table = Table(border_style="cyan")
+    table.add_column("Span", style="bold yellow")
+    for column in ("Count", "p50 ms", "p95 ms", "p99 ms", "Max ms"):
+        table.add_column(column, justify="right")
+    for name, summary in summaries.items():
+        table.add_row(name, str(summary["count"]),
+                      *(f"{summary[key] * 1000:.1f}" for key in ("p50", "p95", "p99", "max")))
+    api = api_stats()
+    if api:
+        table.caption = (f"API calls: {api['calls']}  Retries: {api['retries']}  Failures: {api['failures']}  "
+                         f"Throttled: {api['throttled']:.1f}s  Circuit: {api['circuit']}")
+    facts = fact_pipeline_stats()
+    if facts:
+        line = (f"Fact queue: {facts['depth']}/{facts['capacity']} (peak {facts['max_depth']})  "
+                f"Classified: {facts['processed']}  Facts: {facts['facts']}  Dropped: {facts['dropped']}")
+        table.caption = f"{table.caption}\n{line}" if table.caption else line
+    stores = fact_store_stats()
+    if stores:
+        line = "Fact stores: " + "  ".join(
+            f"{name} {store['count']}/{store['max_count']} ({store['bytes'] / 1e6:.1f}/{store['max_bytes'] / 1e6:.1f} MB, "
+            f"evicted {store['evicted']})"
+            for name, store in stores.items())
+        line += f"  Half-life: {stores['context']['half_life'] / 86400:g} days"
+        table.caption = f"{table.caption}\n{line}" if table.caption else line
+    line = archive_caption(archive_stats())
+    table.caption = f"{table.caption}\n{line}" if table.caption else line
+    console.print(Panel(table, title="Latency", border_style="cyan"))
+
+def export_stats():
+    """Write the latency summaries as Prometheus text and JSON lines."""
+    prom_path = metrics.write_prometheus()
+    jsonl_path = metrics.write_jsonl()
+    console.print(f"[green]Wrote {prom_path} and appended to {jsonl_path}.[/green]")
+
+def response_panel(response):
+    """Build the panel that shows an assistant reply."""
+    response_text = Text()
+    response_text.append("Assistant: ", style="bold green")
+    response_text.append(response, style="white")
+    return Panel(response_text, border_style="green")
+
+def stream_response(user_input):
+    """Render the assistant reply live as chunks arrive."""
+    response = ""
+    with closing(query_llama_stream(user_input)) as chunks:
+        with Live(response_panel(response), console=console, refresh_per_second=15) as live:
+            for chunk in chunks:
+                response += chunk
+                with metrics.span("render"):
+                    live.update(response_panel(response))
+
+def main(stream=False):
     """Main function to run the chat interface."""
     # Create a styled ASCII art panel
     ascii_panel = Panel(Text(ASCII_ART, style="bold blue"), 
@@ -106,7 +291,14 @@ def main():
     console.print(Panel(welcome_text, border_style="green"))
     
     # Initialize database and start session
-    init_db()
+    init_db(background=True)
+    atexit.register(shutdown)
+    
+    # Last /search query and the offset of its next page
+    search_query, search_offset = None, 0
+    
+    # First and last (timestamp, id) keys of the /memory page on screen
+    memory_page = None
     
     while True:
         try:
@@ -114,7 +306,7 @@ def main():
             
             if user_input.lower() == "/exit":
                 # Save session to GitHub before exiting
-                save_session_to_github()
+                exit_session()
                 exit_text = Text("Thank you for using MCP Chat!\nGoodbye!", style="bold green")
                 console.print(Panel(exit_text, border_style="green"))
                 break
@@ -123,29 +315,91 @@ def main():
                 print_help()
                 
             elif user_input.lower() == "/memory":
-                print_session()
+                memory_page = print_memory_page(iter_memory_page())
+                if memory_page is None:
+                    console.print(Panel("No messages in this session.", style="yellow italic"))
+                
+            elif user_input.lower() in ("/memory next", "/memory prev"):
+                newer = user_input.lower() == "/memory next"
+                if memory_page is None:
+                    console.print("[yellow]Use /memory to open the history first.[/yellow]")
+                else:
+                    if newer:
+                        rows = iter_memory_page(after=memory_page[1])
+                    else:
+                        rows = iter_memory_page(before=memory_page[0])
+                    page = print_memory_page(rows)
+                    if page is None:
+                        console.print(f"[yellow]No {'newer' if newer else 'older'} messages.[/yellow]")
+                    else:
+                        memory_page = page
+                
+            elif user_input.lower().startswith("/memory "):
+                msg_id = user_input.split(" ", 1)[1].strip()
+                key = memory_key(msg_id)
+                if key is None:
+                    console.print(f"[red]No message with ID {escape(msg_id)}.[/red]")
+                else:
+                    memory_page = print_memory_page(iter_memory_page(after=key, inclusive=True))
+                
+            elif user_input.lower() == "/sync":
+                print_sync_status()
+                
+            elif user_input.lower() == "/cache":
+                print_cache_stats()
+                
+            elif user_input.lower() == "/cache clear":
+                clear_cache()
+                console.print("[green]Response cache cleared.[/green]")
+                
+            elif user_input.lower() == "/stats":
+                print_stats()
+                
+            elif user_input.lower() == "/stats export":
+                export_stats()
+                
+            elif user_input.lower() == "/facts":
+                print_facts()
+                
+            elif user_input.lower() == "/facts backfill":
+                with console.status("Classifying stored turns..."):
+                    classified = backfill_facts()
+                stats = fact_pipeline_stats()
+                console.print(f"[green]Classified {classified} turns; {stats['facts']} facts found so far.[/green]")
+                
+            elif user_input.lower() == "/archive":
+                print_archive()
+                
+            elif user_input.lower().startswith("/archive search "):
+                print_archive_search(user_input[len("/archive search "):].strip())
+                
+            elif user_input.lower().startswith("/archive "):
+                print_archived_session(user_input.split(" ", 1)[1].strip())
+                
+            elif user_input.lower() == "/dedupe":
+                merged = merge_near_duplicate_facts()
+                console.print(f"[green]Merged {merged} near-duplicate facts.[/green]")
+                
+            elif user_input.lower() == "/search more":
+                if search_query is None:
+                    console.print("[yellow]No previous search. Use /search <keyword>.[/yellow]")
+                else:
+                    tag_filter(search_query, SEARCH_PAGE_SIZE, search_offset)
+                    search_offset += SEARCH_PAGE_SIZE
+                
+            elif user_input.lower().startswith("/search "):
+                search_query = user_input[len("/search "):].strip()
+                tag_filter(search_query, SEARCH_PAGE_SIZE)
+                search_offset = SEARCH_PAGE_SIZE
                 
             elif user_input.lower() == "/delete all":
                 # Delete all messages from current session
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM context")
-                cursor.execute("DELETE FROM facts")
-                conn.commit()
-                conn.close()
-                
-                # Clear context.json and push to GitHub
-                with open("context.json", "w") as f:
-                    json.dump([], f)
-                try:
-                    subprocess.run(["git", "add", "context.json"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    subprocess.run(["git", "commit", "-m", "Clear all memory"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    subprocess.run(["git", "push"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                except subprocess.CalledProcessError as e:
-                    error_text = Text(f"Failed to update GitHub: {e}", style="bold red")
-                    console.print(Panel(error_text, border_style="red"))
-                
-                success_text = Text("All memory has been deleted from local storage and GitHub.", style="bold green")
+                delete_all_memory()
+                
+                # Push the deletions to GitHub in the background
+                request_sync("Clear all memory")
+                
+                success_text = Text("All memory has been deleted locally; GitHub will be updated shortly.", style="bold green")
                 console.print(Panel(success_text, border_style="green"))
                 
             elif user_input.lower().startswith("/delete "):
@@ -157,15 +411,17 @@ def main():
                 
             else:
                 # Process the query and get response
-                response = query_llama(user_input)
-                response_text = Text()
-                response_text.append("Assistant: ", style="bold green")
-                response_text.append(response, style="white")
-                console.print(Panel(response_text, border_style="green"))
+                with metrics.span("turn"):
+                    if stream:
+                        stream_response(user_input)
+                    else:
+                        response = query_llama(user_input)
+                        with metrics.span("render"):
+                            console.print(response_panel(response))
                 
         except KeyboardInterrupt:
             # Save session to GitHub before exiting
-            save_session_to_github()
+            exit_session()
             exit_text = Text("Session interrupted.\nGoodbye!", style="bold yellow")
             console.print(Panel(exit_text, border_style="yellow"))
             break
@@ -173,5 +429,56 @@ def main():
             error_text = Text(f"Error: {str(e)}", style="bold red")
             console.print(Panel(error_text, border_style="red"))
 
+def run_batch_command(args):
+    """Answer a JSONL file of prompts without the interactive loop."""
+    from batch import run_batch
+    
+    init_db()
+    atexit.register(shutdown)
+    answered, failed, skipped = run_batch(args.input, args.output, args.workers)
+    
+    # Keep the new conversations like an interactive session would
+    save_session_to_github()
+    console.print(f"[green]Batch finished: {answered} answered, {failed} failed, "
+                  f"{skipped} skipped; results in {args.output}[/green]")
+    return 1 if failed else 0
+
+def run_server_command(args):
+    """Serve many concurrent chat sessions over HTTP."""
+    from server import serve
+    
+    init_db()
+    atexit.register(shutdown)
+    serve(args.host, args.port, args.llm_concurrency)
+    save_session_to_github()
+    return 0
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="MCP Chat")
+    parser.add_argument("--stream", action="store_true",
+                        default=os.getenv("MCP_STREAM") == "1",
+                        help="render replies as they stream in (or set MCP_STREAM=1)")
+    parser.add_argument("--deterministic", action="store_true",
+                        default=os.getenv("MCP_DETERMINISTIC") == "1",
+                        help="sample at temperature 0 and cache replies (or set MCP_DETERMINISTIC=1)")
+    commands = parser.add_subparsers(dest="command")
+    batch_parser = commands.add_parser("batch", help="answer prompts from a JSONL file")
+    batch_parser.add_argument("input", nargs="?", default="requests.jsonl",
+                              help="JSONL file with a \"prompt\" or \"prompts\" per line")
+    batch_parser.add_argument("-o", "--output", default="responses.jsonl",
+                              help="JSONL results file, also the checkpoint to resume from")
+    batch_parser.add_argument("-w", "--workers", type=int, default=4,
+                              help="prompts answered concurrently")
+    serve_parser = commands.add_parser("serve", help="serve concurrent sessions over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--llm-concurrency", type=int, default=8,
+                              help="prompts answered at once across all sessions")
+    args = parser.parse_args()
+    if args.deterministic:
+        logic.TEMPERATURE = 0.0
+    if args.command == "batch":
+        raise SystemExit(run_batch_command(args))
+    if args.command == "serve":
+        raise SystemExit(run_server_command(args))
+    main(stream=args.stream)
@@ -0,0 +1,182 @@
+# metrics.py
+
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Timing is on unless MCP_METRICS=0
+enabled = os.getenv("MCP_METRICS", "1") != "0"
+
+PROMETHEUS_PATH = os.getenv("MCP_METRICS_PROM", "mcp_metrics.prom")
+JSONL_PATH = os.getenv("MCP_METRICS_JSONL", "mcp_metrics.jsonl")
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Log-spaced buckets: four per doubling (~19% wide) from 1 µs up
+_BUCKET_BASE = 1e-6
+_BUCKETS_PER_DOUBLING = 4
+_BUCKET_COUNT = 120
+
+
+class Histogram:
+    """Fixed-memory latency histogram with log-spaced buckets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one observation."""
+        if seconds > _BUCKET_BASE:
+            bucket = int(math.log2(seconds / _BUCKET_BASE) * _BUCKETS_PER_DOUBLING)
+            bucket = min(bucket, _BUCKET_COUNT - 1)
+        else:
+            bucket = 0
+        with self._lock:
+            self._counts[bucket] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """Approximate q-quantile (0..1) in seconds, 0 when empty."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+            largest = self.max
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bucket, n in enumerate(counts):
+            if n and seen + n >= rank:
+                # Interpolate geometrically inside the bucket
+                fraction = (rank - seen) / n
+                lower = _BUCKET_BASE * 2 ** (bucket / _BUCKETS_PER_DOUBLING)
+                return min(largest, lower * 2 ** (fraction / _BUCKETS_PER_DOUBLING))
+            seen += n
+        return largest
+
+    def summary(self):
+        """Count, mean, max and the QUANTILES, in seconds."""
+        result = {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = self.percentile(q)
+        return result
+
+
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name):
+    """Return the histogram for a span name, creating it on first use."""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(name, Histogram())
+    return hist
+
+
+def record(name, seconds):
+    """Record a duration measured elsewhere."""
+    if enabled:
+        histogram(name).record(seconds)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name).record(time.perf_counter() - start)
+
+
+def span(name):
+    """Context manager timing its body into the named histogram."""
+    if not enabled:
+        return _NULL_SPAN
+    return _timed_span(name)
+
+
+def timed(name):
+    """Decorator timing each call into the named histogram."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram(name).record(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def stats():
+    """Summary of every span recorded so far, by name."""
+    with _registry_lock:
+        items = sorted(_histograms.items())
+    return {name: hist.summary() for name, hist in items}
+
+
+def reset():
+    """Forget every recorded span."""
+    with _registry_lock:
+        _histograms.clear()
+
+
+def write_prometheus(path=PROMETHEUS_PATH):
+    """Write the spans as a Prometheus summary in text exposition format."""
+    lines = [
+        "# HELP mcp_span_seconds Time spent in instrumented operations.",
+        "# TYPE mcp_span_seconds summary",
+    ]
+    for name, summary in stats().items():
+        for q in QUANTILES:
+            value = summary[f"p{round(q * 100)}"]
+            lines.append(f'mcp_span_seconds{{span="{name}",quantile="{q}"}} {value:.9f}')
+        lines.append(f'mcp_span_seconds_sum{{span="{name}"}} {summary["sum"]:.9f}')
+        lines.append(f'mcp_span_seconds_count{{span="{name}"}} {summary["count"]}')
+
+    # Replace atomically so a scraper never reads a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_jsonl(path=JSONL_PATH):
+    """Append one JSON line per span with the current summary."""
+    now = time.time()
+    with open(path, "a", encoding="utf-8") as f:
+        for name, summary in stats().items():
+            f.write(json.dumps({"time": now, "span": name, **summary}) + "\n")
+    return path
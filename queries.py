@@ -0,0 +1,149 @@
+# queries.py
+"""
+SQL of the queries on the per-turn hot path.
+
+logic.py and llm_cache.py run these, and setup_db.HOT_QUERIES checks their
+plans, so the statement that is checked is the statement that runs.
+"""
+
+# Stored messages
+GET_MESSAGES = """
+    SELECT id, role, content, is_fact
+    FROM context
+    ORDER BY timestamp
+"""
+
+GET_FACTS = """
+    SELECT id, role, content, is_fact
+    FROM context
+    WHERE is_fact = 1
+    ORDER BY timestamp
+"""
+
+GET_HISTORY = """
+    SELECT id, role, content, is_fact
+    FROM context
+    WHERE is_fact = 0
+    ORDER BY timestamp
+"""
+
+SESSION_MESSAGES = """
+    SELECT id, role, content, is_fact
+    FROM context
+    WHERE session_id = ?
+    ORDER BY timestamp
+"""
+
+SESSION_HISTORY = """
+    SELECT id, role, content, is_fact
+    FROM context
+    WHERE is_fact = 0 AND session_id = ?
+    ORDER BY timestamp
+"""
+
+SESSION_BACKFILL = "UPDATE context SET session_id = ? WHERE session_id IS NULL"
+
+FACT_BY_HASH = "SELECT id FROM context WHERE content_hash = ? AND is_fact = 1"
+
+MESSAGE_BY_ID = "SELECT is_fact, content_hash FROM context WHERE id = ?"
+
+# /memory pages, keyed on (timestamp, id)
+MEMORY_LATEST = """
+    SELECT id, role, content, is_fact, timestamp
+    FROM context
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
+
+MEMORY_NEXT = """
+    SELECT id, role, content, is_fact, timestamp
+    FROM context
+    WHERE (timestamp, id) > (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+"""
+
+MEMORY_FROM = """
+    SELECT id, role, content, is_fact, timestamp
+    FROM context
+    WHERE (timestamp, id) >= (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+"""
+
+MEMORY_PREV = """
+    SELECT id, role, content, is_fact, timestamp
+    FROM context
+    WHERE (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
+
+# Classified facts
+LIST_FACTS = """
+    SELECT id, content, category, source_session
+    FROM facts
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+BACKFILL_TURNS = """
+    SELECT session_id, role, content
+    FROM context
+    ORDER BY session_id, timestamp
+"""
+
+# Rows of each fact table that count as facts
+FACT_ROWS = {"context": "is_fact = 1", "facts": "content_hash IS NOT NULL"}
+
+# Formatted with a table and its FACT_ROWS filter
+FACT_ACCESS_UPDATE = """
+    UPDATE {table} SET weight = ?, last_access = ?, confidence = ?
+    WHERE content_hash = ? AND {where}
+"""
+
+EVICT_LOOKUP = "SELECT id FROM {table} WHERE content_hash = ? AND {where}"
+
+# Summaries
+SESSION_SUMMARY = """
+    SELECT summaries.id, summaries.content
+    FROM sessions JOIN summaries ON summaries.id = sessions.summary_id
+    WHERE sessions.id = ?
+"""
+
+PRIOR_SUMMARIES = """
+    SELECT content
+    FROM summaries
+    WHERE parent_id IS NULL AND (session_id IS NULL OR session_id != ?)
+    ORDER BY last_time DESC
+    LIMIT ?
+"""
+
+OPEN_SUMMARIES = """
+    SELECT id, content, messages, first_time, last_time
+    FROM summaries
+    WHERE parent_id IS NULL AND level = ?
+      AND NOT EXISTS (
+        SELECT 1 FROM sessions
+        WHERE sessions.id = summaries.session_id AND sessions.end_time IS NULL
+      )
+    ORDER BY last_time
+    LIMIT ?
+"""
+
+# Sessions
+CLOSE_SESSIONS = """
+    UPDATE sessions
+    SET end_time = CURRENT_TIMESTAMP
+    WHERE end_time IS NULL
+"""
+
+UNARCHIVED_SESSIONS = """
+    SELECT id
+    FROM sessions
+    WHERE end_time IS NOT NULL AND archived IS NULL
+    ORDER BY end_time
+"""
+
+# LLM response cache
+CACHE_LOOKUP = "SELECT response, created FROM llm_cache WHERE key = ?"
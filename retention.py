@@ -0,0 +1,159 @@
+# retention.py
+
+import math
+import heapq
+import threading
+
+# Importances below this are treated as equal to it, keeping ln() finite
+MIN_CONFIDENCE = 1e-6
+
+
+class ImportanceHeap:
+    """
+    Capacity bookkeeping for a fact store, evicting the least important first.
+
+    A fact's importance at time now is
+
+        confidence * w * 2 ** (-(now - t_last) / half_life)
+
+    where w counts accesses, each one decayed by its age, and t_last is the
+    latest access. Its logarithm differs from ln(confidence * w) + λ * t_last
+    only by a term shared by every fact, so that key orders facts the same
+    way at every moment and never needs updating as time passes. A min-heap
+    with lazy deletion on it makes add, touch, remove and each eviction
+    O(log n).
+    """
+
+    def __init__(self, max_count=None, max_bytes=None, half_life=14 * 86400.0):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.half_life = half_life
+        self.decay = math.log(2) / half_life
+        self._lock = threading.Lock()
+        self._heap = []
+        self._entries = {}  # key -> [heap key, weight, last, confidence, size]
+        self._dirty = set()
+        self.bytes = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _rank(self, weight, last, confidence):
+        return math.log(max(weight * confidence, MIN_CONFIDENCE)) + self.decay * last
+
+    def _push(self, key, entry):
+        """Re-key an entry; caller holds the lock."""
+        entry[0] = self._rank(entry[1], entry[2], entry[3])
+        heapq.heappush(self._heap, (entry[0], key))
+        # Drop superseded heap items once they outnumber live ones
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [(entry[0], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, key, size, confidence=1.0, weight=1.0, last=0.0, dirty=True):
+        """Track a stored fact; an already tracked one counts as accessed at last."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] = entry[1] * math.exp(-self.decay * max(last - entry[2], 0.0)) + 1.0
+                entry[2] = max(last, entry[2])
+            else:
+                entry = self._entries[key] = [0.0, weight, last, confidence, size]
+                self.bytes += size
+            self._push(key, entry)
+            if dirty:
+                self._dirty.add(key)
+
+    def touch(self, keys, now):
+        """Record that facts were retrieved at time now."""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry[1] = entry[1] * math.exp(-self.decay * max(now - entry[2], 0.0)) + 1.0
+                entry[2] = max(now, entry[2])
+                self._push(key, entry)
+                self._dirty.add(key)
+
+    def remove(self, key):
+        """Stop tracking a fact deleted elsewhere."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[4]
+                self._dirty.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+            self._dirty.clear()
+            self.bytes = 0
+
+    def importance(self, key, now):
+        """Current importance of a tracked fact, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[3] * entry[1] * math.exp(-self.decay * max(now - entry[2], 0.0))
+
+    def over_limit(self):
+        """Whether the store holds more facts or bytes than allowed."""
+        return ((self.max_count is not None and len(self._entries) > self.max_count)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes))
+
+    def evict(self, low_water=1.0):
+        """
+        Pop the least important facts while the store is over a limit.
+
+        Once over, eviction continues down to low_water times each limit so
+        the next few additions do not trigger it again. Returns the evicted
+        keys, which the caller deletes from storage.
+        """
+        with self._lock:
+            if not self.over_limit():
+                return []
+            max_count = None if self.max_count is None else int(self.max_count * low_water)
+            max_bytes = None if self.max_bytes is None else int(self.max_bytes * low_water)
+            evicted = []
+            while self._heap and ((max_count is not None and len(self._entries) > max_count)
+                                  or (max_bytes is not None and self.bytes > max_bytes)):
+                rank, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != rank:
+                    continue
+                del self._entries[key]
+                self._dirty.discard(key)
+                self.bytes -= entry[4]
+                self.evicted += 1
+                self.evicted_bytes += entry[4]
+                evicted.append(key)
+            return evicted
+
+    def take_dirty(self):
+        """(weight, last, confidence, key) of facts changed since the last call."""
+        with self._lock:
+            dirty = [(self._entries[key][1], self._entries[key][2], self._entries[key][3], key)
+                     for key in self._dirty]
+            self._dirty.clear()
+            return dirty
+
+    def stats(self):
+        """Size, limits and eviction counters for display."""
+        with self._lock:
+            return {
+                "count": len(self._entries),
+                "bytes": self.bytes,
+                "max_count": self.max_count,
+                "max_bytes": self.max_bytes,
+                "half_life": self.half_life,
+                "evicted": self.evicted,
+                "evicted_bytes": self.evicted_bytes,
+            }
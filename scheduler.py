@@ -0,0 +1,290 @@
+# scheduler.py
+
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+from context_window import estimate_tokens
+
+# HTTP statuses worth retrying: rate limited, overloaded or failing upstream
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Client errors without a status code that are worth retrying
+RETRYABLE_ERRORS = frozenset({"APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectionError"})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add the tokens earned since the last update; caller holds the lock."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Take amount tokens, sleeping until enough have accumulated; returns the wait."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def refund(self, amount):
+        """Return tokens that were reserved but not used."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def drain(self, seconds):
+        """Empty the bucket so no tokens are handed out for about seconds."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated request failures.
+
+    After failure_threshold consecutive failures the circuit opens for
+    reset_timeout seconds; then one trial request is let through and its
+    outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError(
+                    f"API temporarily unavailable after repeated failures; retrying in {max(remaining, 0):.1f}s")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+def _status_code(error):
+    """HTTP status of an API error, if it has one."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(error):
+    """Whether a failed request may succeed if sent again."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait before retrying, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class _ReleasingStream:
+    """Iterate a streamed response, releasing its concurrency slot at the end."""
+
+    def __init__(self, stream, release):
+        self._stream = iter(stream)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class RateLimitedClient:
+    """
+    Drop-in wrapper for a Groq-style client that paces and retries requests.
+
+    client.chat.completions.create(**kwargs) is passed through a requests
+    per minute and a tokens per minute bucket and a concurrency limit;
+    retryable failures are retried with jittered exponential backoff,
+    honoring retry-after headers, and a circuit breaker stops sending
+    requests while the API keeps failing.
+    """
+
+    def __init__(self, client, rpm=30, tpm=6000, max_concurrency=4, max_retries=4,
+                 base_backoff=1.0, max_backoff=30.0, breaker=None):
+        self.client = client
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0.0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _estimate(self, kwargs):
+        """Tokens a request may use: the prompt plus the completion limit."""
+        # estimate_tokens already counts each message's framing
+        prompt = sum(estimate_tokens(msg["content"]) for msg in kwargs.get("messages", ()))
+        return prompt + kwargs.get("max_tokens", 0)
+
+    def _backoff(self, attempt, error):
+        """Delay before the next attempt."""
+        delay = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        hinted = retry_after(error)
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.max_backoff))
+        return delay
+
+    def create(self, **kwargs):
+        """Send a chat completion request, pacing and retrying as needed."""
+        self.breaker.allow()
+        estimate = self._estimate(kwargs)
+        stream = kwargs.get("stream", False)
+        attempt = 0
+        try:
+            while True:
+                throttled = self.requests.acquire(1) + self.tokens.acquire(estimate)
+                self._slots.acquire()
+                try:
+                    response = self.client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    self._slots.release()
+                    retryable = is_retryable(e)
+                    retry = retryable and attempt < self.max_retries
+                    with self._lock:
+                        self.calls += 1
+                        self.throttled += throttled
+                        if retry:
+                            self.retries += 1
+                        else:
+                            self.failures += 1
+                    if not retryable:
+                        # The API answered, it just rejected this request
+                        self.breaker.record_success()
+                        raise
+                    if not retry:
+                        self.breaker.record_failure()
+                        raise
+                    delay = self._backoff(attempt, e)
+                    hinted = retry_after(e)
+                    if _status_code(e) == 429 and hinted:
+                        # Everyone else waits out the limit too
+                        self.requests.drain(min(hinted, self.max_backoff))
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                except BaseException:
+                    self._slots.release()
+                    raise
+
+                with self._lock:
+                    self.calls += 1
+                    self.throttled += throttled
+                self.breaker.record_success()
+                if stream:
+                    # The slot stays taken until the stream is consumed or closed
+                    return _ReleasingStream(response, self._slots.release)
+                self._slots.release()
+
+                # Give back the reserved completion tokens that went unused
+                usage = getattr(response, "usage", None)
+                used = getattr(usage, "total_tokens", None)
+                if isinstance(used, int) and used < estimate:
+                    self.tokens.refund(estimate - used)
+                return response
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Interrupted mid-request or mid-backoff: a half-open trial
+                # must still end, or the circuit never lets a request through
+                self.breaker.record_failure()
+            raise
+
+    def stats(self):
+        """Counters for display."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "circuit": self.breaker.state,
+            }
@@ -0,0 +1,204 @@
+# server.py
+
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import logic
+import metrics
+from logic import console
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+
+class HTTPError(Exception):
+    """An error response with a status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ChatServer:
+    """
+    JSON-over-HTTP chat server for many concurrent sessions.
+
+    Routes:
+        POST   /sessions                    start a session
+        POST   /sessions/<id>/messages      {"prompt": ...} -> {"reply": ...}
+        GET    /sessions/<id>/messages      the session's conversation
+        DELETE /sessions/<id>               end a session
+        GET    /stats                       latency and API counters
+        GET    /health
+
+    Sessions share the storage pool and the rate-limited API client; at
+    most llm_concurrency prompts are answered at once, and prompts of one
+    session are answered in order.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, llm_concurrency=8, workers=32):
+        self.host = host
+        self.port = port
+        self._llm_slots = None
+        self._llm_concurrency = llm_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat")
+        self._sessions = {}
+        self._server = None
+
+    async def _blocking(self, func, *args):
+        """Run a blocking logic call on the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        """Start listening; returns once the socket is bound."""
+        self._llm_slots = asyncio.Semaphore(self._llm_concurrency)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_BODY)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        console.print(f"[green]Serving MCP chat on http://{self.host}:{self.port}[/green]")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections and wait for in-flight work."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    async def _handle(self, reader, writer):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                metrics.record("http_request", time.perf_counter() - start)
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            self._write_response(writer, e.status, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Parse one request; None when the client closed the connection."""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return method.upper(), urlsplit(target).path, body, keep_alive
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def _route(self, method, path, body):
+        """Dispatch a request to its handler; returns (status, payload)."""
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "sessions": len(self._sessions)}
+        if parts == ["stats"] and method == "GET":
+            return 200, {"latency": metrics.stats(), "api": logic.api_stats(),
+                         "fact_stores": logic.fact_store_stats(), "archive": logic.archive_stats()}
+        if parts == ["sessions"] and method == "POST":
+            return await self._start_session()
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session_id = parts[1]
+            if session_id not in self._sessions:
+                raise HTTPError(404, f"unknown session {session_id}")
+            if parts[2:] == ["messages"] and method == "POST":
+                return await self._post_message(session_id, self._json(body))
+            if parts[2:] == ["messages"] and method == "GET":
+                return 200, {"messages": await self._blocking(logic.get_history, session_id)}
+            if len(parts) == 2 and method == "DELETE":
+                return await self._end_session(session_id)
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"no route for {path}")
+
+    @staticmethod
+    def _json(body):
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON") from None
+
+    async def _start_session(self):
+        session_id = await self._blocking(logic.start_session)
+        self._sessions[session_id] = asyncio.Lock()
+        return 201, {"session_id": session_id}
+
+    async def _end_session(self, session_id):
+        async with self._sessions.pop(session_id):
+            await self._blocking(logic.end_session, session_id)
+        return 200, {"session_id": session_id, "ended": True}
+
+    async def _post_message(self, session_id, request):
+        prompt = request.get("prompt") if isinstance(request, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPError(400, "expected {\"prompt\": \"...\"}")
+        # One prompt at a time per session keeps its history in order
+        async with self._sessions[session_id]:
+            async with self._llm_slots:
+                try:
+                    reply = await self._blocking(logic.answer, prompt, session_id)
+                except Exception as e:
+                    raise HTTPError(502, f"model request failed: {e}") from None
+        return 200, {"session_id": session_id, "reply": reply}
+
+
+def serve(host="127.0.0.1", port=8765, llm_concurrency=8):
+    """Run the chat server until interrupted."""
+    server = ChatServer(host, port, llm_concurrency)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -1,51 +1,365 @@
 import sqlite3
-import os
-
-def setup_database():
-    # Remove existing database if it exists
-    if os.path.exists("context.db"):
-        os.remove("context.db")
-    
-    with sqlite3.connect("context.db") as conn:
-        cursor = conn.cursor()
-
-        # Create context table for session storage
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS context (
-            id TEXT PRIMARY KEY,
-            session_id TEXT,
-            role TEXT,
-            content TEXT,
-            is_fact BOOLEAN DEFAULT 0,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions(id)
-        );
-        """)
+from dedupe import content_hash
+import queries
 
-        # Create facts table for long-term storage
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS facts (
-            id TEXT PRIMARY KEY,
-            role TEXT,
-            content TEXT,
-            source_session TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (source_session) REFERENCES sessions(id)
-        );
-        """)
+# FTS5 indexes over message and fact content, kept in sync by triggers.
+# They use the tables' implicit rowids as external content keys, so run
+# setup_search_index(..., rebuild=True) after a VACUUM of context.db.
+SEARCH_INDEX_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS context_fts USING fts5(
+        content, content='context', content_rowid='rowid'
+    );
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(
+        content, content='facts', content_rowid='rowid'
+    );
+    """,
+]
+
+for _table in ("context", "facts"):
+    SEARCH_INDEX_SQL += [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_table}_fts_insert AFTER INSERT ON {_table} BEGIN
+            INSERT INTO {_table}_fts (rowid, content) VALUES (new.rowid, new.content);
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_table}_fts_delete AFTER DELETE ON {_table} BEGIN
+            INSERT INTO {_table}_fts ({_table}_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_table}_fts_update AFTER UPDATE OF content ON {_table} BEGIN
+            INSERT INTO {_table}_fts ({_table}_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            INSERT INTO {_table}_fts (rowid, content) VALUES (new.rowid, new.content);
+        END;
+        """,
+    ]
+
+def setup_search_index(conn, rebuild=False):
+    """Create the full-text search index, filling it from existing rows if new."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'context_fts'"
+    ).fetchone()
+    for sql in SEARCH_INDEX_SQL:
+        conn.execute(sql)
+    if rebuild or not exists:
+        conn.execute("INSERT INTO context_fts (context_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO facts_fts (facts_fts) VALUES ('rebuild')")
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def setup_content_hash(conn):
+    """Add content_hash columns, backfill them and enforce unique facts."""
+    for table in ("context", "facts"):
+        if "content_hash" in _columns(conn, table):
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN content_hash TEXT")
+        rows = conn.execute(f"SELECT rowid, role, content FROM {table}").fetchall()
+        conn.executemany(
+            f"UPDATE {table} SET content_hash = ? WHERE rowid = ?",
+            [(content_hash(role or "", content or ""), rowid) for rowid, role, content in rows],
+        )
 
-        # Create sessions table to track conversation sessions
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sessions (
-            id TEXT PRIMARY KEY,
-            start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-            end_time DATETIME,
-            facts_count INTEGER DEFAULT 0
-        );
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'context_fact_hash'"
+    ).fetchone()
+    if exists:
+        return
+
+    # Keep the newest copy of each duplicated fact before adding the indexes
+    for table, where in (("context", "WHERE is_fact = 1"), ("facts", "")):
+        conn.execute(f"""
+            DELETE FROM {table}
+            WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY content_hash ORDER BY timestamp DESC, rowid DESC
+                    ) AS n
+                    FROM {table} {where}
+                ) WHERE n > 1
+            )
         """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS context_fact_hash
+        ON context (content_hash) WHERE is_fact = 1
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS facts_content_hash
+        ON facts (content_hash)
+    """)
+
+def create_base_schema(conn):
+    """Create the original context, facts and sessions tables."""
+    # Create context table for session storage
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS context (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        role TEXT,
+        content TEXT,
+        is_fact BOOLEAN DEFAULT 0,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES sessions(id)
+    );
+    """)
+
+    # Create facts table for long-term storage
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS facts (
+        id TEXT PRIMARY KEY,
+        role TEXT,
+        content TEXT,
+        source_session TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (source_session) REFERENCES sessions(id)
+    );
+    """)
+
+    # Create sessions table to track conversation sessions
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+        end_time DATETIME,
+        facts_count INTEGER DEFAULT 0
+    );
+    """)
+
+def add_hot_path_indexes(conn):
+    """Index the columns the per-turn queries filter and sort on."""
+    # Session-scoped history and the session_id backfill
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS context_session_time
+        ON context (session_id, timestamp)
+    """)
+    # get_facts (is_fact = 1) and the non-fact history (is_fact = 0)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS context_fact_time
+        ON context (is_fact, timestamp)
+    """)
+    # One session's conversation, without its facts
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS context_session_history
+        ON context (session_id, timestamp) WHERE is_fact = 0
+    """)
+    # Full history in timestamp order without a sort
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS context_time
+        ON context (timestamp)
+    """)
+    # The open session closed by clear_session
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS sessions_open
+        ON sessions (end_time) WHERE end_time IS NULL
+    """)
+
+def add_response_cache(conn):
+    """Create the table behind the LLM response cache."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT,
+        created REAL,
+        last_used REAL
+    );
+    """)
+    # Least recently used entries are evicted first
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS llm_cache_last_used
+        ON llm_cache (last_used)
+    """)
 
+def add_memory_page_index(conn):
+    """Key context rows on (timestamp, id) for keyset pagination."""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS context_time_id
+        ON context (timestamp, id)
+    """)
+    # Superseded by context_time_id, which has it as a prefix
+    conn.execute("DROP INDEX IF EXISTS context_time")
+
+def add_fact_categories(conn):
+    """Record each fact's extracted category and count facts per session."""
+    if "category" not in _columns(conn, "facts"):
+        conn.execute("ALTER TABLE facts ADD COLUMN category TEXT")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS facts_session
+        ON facts (source_session)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS facts_time
+        ON facts (timestamp)
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS facts_count_insert AFTER INSERT ON facts BEGIN
+            UPDATE sessions SET facts_count = facts_count + 1 WHERE id = new.source_session;
+        END;
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS facts_count_delete AFTER DELETE ON facts BEGIN
+            UPDATE sessions SET facts_count = facts_count - 1 WHERE id = old.source_session;
+        END;
+    """)
+
+def add_session_summaries(conn):
+    """Store rolling session summaries and the summaries built over them."""
+    # Level 0 summarizes one session's folded turns; a summary of level n + 1
+    # merges several of level n, which then point at it through parent_id
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS summaries (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        level INTEGER NOT NULL DEFAULT 0,
+        parent_id TEXT,
+        content TEXT NOT NULL,
+        messages INTEGER DEFAULT 0,
+        first_time DATETIME,
+        last_time DATETIME,
+        FOREIGN KEY (session_id) REFERENCES sessions(id),
+        FOREIGN KEY (parent_id) REFERENCES summaries(id)
+    );
+    """)
+    if "summary_id" not in _columns(conn, "sessions"):
+        conn.execute("ALTER TABLE sessions ADD COLUMN summary_id TEXT REFERENCES summaries(id)")
+    # Summaries of one level waiting to be merged
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS summaries_open
+        ON summaries (level, last_time) WHERE parent_id IS NULL
+    """)
+    # The newest top-level summaries sent with each prompt
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS summaries_recent
+        ON summaries (last_time) WHERE parent_id IS NULL
+    """)
+
+def add_fact_importance(conn):
+    """Keep the access statistics and confidence used to rank facts for eviction."""
+    # last_access is in Unix seconds; rows without one fall back to timestamp
+    for table in ("context", "facts"):
+        columns = _columns(conn, table)
+        if "weight" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN weight REAL DEFAULT 1.0")
+        if "last_access" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN last_access REAL")
+        if "confidence" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN confidence REAL")
+
+def add_synced_shards(conn):
+    """Remember which memory shards have been imported."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS synced_shards (
+        name TEXT PRIMARY KEY,
+        imported DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+def add_session_archive(conn):
+    """Record when an ended session's turns moved to the compressed archive."""
+    if "archived" not in _columns(conn, "sessions"):
+        conn.execute("ALTER TABLE sessions ADD COLUMN archived DATETIME")
+    # Ended sessions whose turns are still in the hot tables
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS sessions_unarchived
+        ON sessions (end_time) WHERE end_time IS NOT NULL AND archived IS NULL
+    """)
+
+# Schema migrations; the database's PRAGMA user_version is the number of
+# migrations already applied. Only ever append to this list.
+MIGRATIONS = [
+    create_base_schema,
+    setup_search_index,
+    setup_content_hash,
+    add_hot_path_indexes,
+    add_response_cache,
+    add_memory_page_index,
+    add_fact_categories,
+    add_session_summaries,
+    add_fact_importance,
+    add_synced_shards,
+    add_session_archive,
+]
+
+def migrate(conn):
+    """Apply pending migrations in place, one transaction each."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if conn.in_transaction:
         conn.commit()
-        print("[green]Database initialized with MCP architecture.[/green]")
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(MIGRATIONS) - version
+
+# Queries run on every turn, from queries.py; each must be answered from an
+# index rather than a table scan or a temporary sort
+HOT_QUERIES = {
+    "get_messages": (queries.GET_MESSAGES, ()),
+    "get_facts": (queries.GET_FACTS, ()),
+    "get_history": (queries.GET_HISTORY, ()),
+    "session_messages": (queries.SESSION_MESSAGES, ("s",)),
+    "session_history": (queries.SESSION_HISTORY, ("s",)),
+    "session_backfill": (queries.SESSION_BACKFILL, ("s",)),
+    "fact_by_hash": (queries.FACT_BY_HASH, ("h",)),
+    "message_by_id": (queries.MESSAGE_BY_ID, ("m",)),
+    "cache_lookup": (queries.CACHE_LOOKUP, ("k",)),
+    "memory_latest": (queries.MEMORY_LATEST, (20,)),
+    "memory_next": (queries.MEMORY_NEXT, ("t", "m", 20)),
+    "memory_from": (queries.MEMORY_FROM, ("t", "m", 20)),
+    "memory_prev": (queries.MEMORY_PREV, ("t", "m", 20)),
+    "list_facts": (queries.LIST_FACTS, (50,)),
+    "backfill_turns": (queries.BACKFILL_TURNS, ()),
+    "session_summary": (queries.SESSION_SUMMARY, ("s",)),
+    "prior_summaries": (queries.PRIOR_SUMMARIES, ("s", 4)),
+    "open_summaries": (queries.OPEN_SUMMARIES, (0, 8)),
+    "close_session": (queries.CLOSE_SESSIONS, ()),
+    "unarchived_sessions": (queries.UNARCHIVED_SESSIONS, ()),
+}
+for _table, _where in queries.FACT_ROWS.items():
+    HOT_QUERIES[f"fact_access_update_{_table}"] = (
+        queries.FACT_ACCESS_UPDATE.format(table=_table, where=_where), (1.0, 0.0, 1.0, "h"))
+    HOT_QUERIES[f"evict_lookup_{_table}"] = (
+        queries.EVICT_LOOKUP.format(table=_table, where=_where), ("h",))
+
+# Queries that read every row, or stop after a LIMIT, may walk an index in order
+INDEX_WALK_QUERIES = {"get_messages", "memory_latest", "backfill_turns", "list_facts",
+                      "prior_summaries", "unarchived_sessions"}
+
+def check_query_plans(conn):
+    """Return (name, plan) for every hot query that scans or sorts."""
+    failures = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        bad = [step for step in plan if "USE TEMP B-TREE" in step]
+        for step in plan:
+            if step.startswith("SCAN") and not (name in INDEX_WALK_QUERIES and "USING" in step):
+                bad.append(step)
+        if bad:
+            failures.append((name, plan))
+    return failures
+
+def setup_database(path="context.db"):
+    """Create or upgrade the database in place."""
+    with sqlite3.connect(path) as conn:
+        applied = migrate(conn)
+    if applied:
+        print(f"[green]Database initialized with MCP architecture ({applied} migrations applied).[/green]")
 
 if __name__ == "__main__":
+    import sys
+
     setup_database()
+    if "--check-plans" in sys.argv:
+        with sqlite3.connect("context.db") as conn:
+            failures = check_query_plans(conn)
+        for name, plan in failures:
+            print(f"{name}: {' / '.join(plan)}")
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,110 @@
+# shards.py
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+MANIFEST = "manifest.jsonl"
+
+# Concurrent machines each append their own lines to the manifest; git
+# keeps both sides instead of reporting a conflict
+GITATTRIBUTES = f"{MANIFEST} merge=union\n"
+
+
+class ShardStore:
+    """
+    Append-only, content-addressed memory shards in a git-synced directory.
+
+    Each shard is a JSONL file named after the SHA-256 of its bytes and is
+    never changed once written, so a push only adds files and two machines
+    writing the same entries produce the same shard. manifest.jsonl lists
+    shards in the order they were added, one JSON line each. on_write, if
+    given, is called with the name of each new shard once it is listed.
+    """
+
+    def __init__(self, root="memory", on_write=None):
+        self.root = root
+        self.on_write = on_write
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        """File of the shard with this name."""
+        return os.path.join(self.root, "shards", name[:2], f"{name}.jsonl")
+
+    def _setup(self):
+        """Create the directory and its .gitattributes; caller holds the lock."""
+        os.makedirs(os.path.join(self.root, "shards"), exist_ok=True)
+        attributes = os.path.join(self.root, ".gitattributes")
+        if not os.path.exists(attributes):
+            with open(attributes, "w", encoding="utf-8") as f:
+                f.write(GITATTRIBUTES)
+
+    def write(self, entries):
+        """Store entries as a new shard and list it in the manifest; returns its name."""
+        data = b"".join(
+            json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+            for entry in entries
+        )
+        if not data:
+            return None
+        name = hashlib.sha256(data).hexdigest()
+        path = self.path(name)
+
+        with self._lock:
+            self._setup()
+            if os.path.exists(path):
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+            # The shard is durable before the manifest points at it
+            record = {
+                "shard": name,
+                "entries": len(entries),
+                "created": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            with open(self.manifest_path, "ab") as f:
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        if self.on_write is not None:
+            self.on_write(name)
+        return name
+
+    def manifest(self):
+        """Shard names in the order they were added, without duplicates."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        names = []
+        seen = set()
+        with open(self.manifest_path, "rb") as f:
+            for line in f:
+                try:
+                    name = json.loads(line)["shard"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # A torn last line or a stray merge leftover
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return names
+
+    def read(self, name):
+        """
+        The entries of a shard.
+
+        Raises FileNotFoundError if the shard has not arrived yet and
+        ValueError if its contents do not match its name.
+        """
+        with open(self.path(name), "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != name:
+            raise ValueError(f"shard {name} is corrupt")
+        return [json.loads(line) for line in data.splitlines() if line.strip()]
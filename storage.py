@@ -0,0 +1,223 @@
+# storage.py
+
+import sqlite3
+import threading
+import queue
+import time
+from contextlib import contextmanager
+
+# Pragmas applied to every connection
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Number of prepared statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 256
+
+
+class Storage:
+    """
+    Long-lived SQLite connections: one writer and a pool of readers.
+
+    attach maps schema names to further database files opened on every
+    connection, so queries can reach them as schema.table.
+    """
+
+    def __init__(self, path, readers=4, attach=None):
+        self.path = path
+        self.attach = dict(attach or {})
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._readers = queue.LifoQueue()
+        self._reader_count = readers
+        for _ in range(readers):
+            self._readers.put(self._connect())
+        self._closed = False
+
+    def _connect(self):
+        """Open a connection with the storage pragmas applied."""
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        for schema, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            conn.execute(f"PRAGMA {schema}.synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """Borrow the writer connection inside a transaction."""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection from the pool."""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def execute(self, sql, params=()):
+        """Run a single write statement and commit it."""
+        with self.writer() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql, seq_of_params):
+        """Run a write statement for many parameter sets in one transaction."""
+        with self.writer() as conn:
+            return conn.executemany(sql, seq_of_params).rowcount
+
+    def query(self, sql, params=()):
+        """Run a read statement and return all rows."""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """Run a read statement and return the first row."""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def close(self):
+        """Close every connection held by the pool."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._write_lock:
+            self._writer.close()
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+
+
+class WriteBehindQueue:
+    """Background thread that batches inserts into single transactions."""
+
+    def __init__(self, storage, sql, on_commit=None, on_error=None,
+                 max_batch=64, flush_interval=0.05):
+        self.storage = storage
+        self.sql = sql
+        self.on_commit = on_commit
+        self.on_error = on_error
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.committed = 0
+        self.failed = 0
+        self._cond = threading.Condition()
+        self._queue = []
+        self._inflight = []
+        self._flushers = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, row):
+        """Queue one row for insertion."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._queue.append(row)
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+
+    def pending(self):
+        """Rows queued or being written that are not committed yet."""
+        with self._cond:
+            return self._inflight + self._queue
+
+    def _take_batch(self):
+        """Wait for a full batch or the flush interval; None once closed and drained."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            deadline = time.monotonic() + self.flush_interval
+            while (len(self._queue) < self.max_batch
+                   and not self._closed and not self._flushers):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            self._inflight = batch
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self.storage.executemany(self.sql, batch)
+                if self.on_commit:
+                    self.on_commit(batch)
+                committed, failed = len(batch), 0
+            except Exception as e:
+                committed, failed = 0, len(batch)
+                if self.on_error:
+                    self.on_error(e)
+            with self._cond:
+                self._inflight = []
+                self.committed += committed
+                self.failed += failed
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every queued row is committed; False on timeout."""
+        with self._cond:
+            self._flushers += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: not self._queue and not self._inflight, timeout)
+            finally:
+                self._flushers -= 1
+
+    def close(self, timeout=None):
+        """Flush remaining rows and stop the worker thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage(path, attach=None):
+    """Return the shared storage for path, opening it on first use."""
+    global _storage
+    with _storage_lock:
+        if _storage is None or _storage.path != path:
+            if _storage is not None:
+                _storage.close()
+            _storage = Storage(path, attach=attach)
+        return _storage
+
+
+def close_storage():
+    """Close the shared storage if it is open."""
+    global _storage
+    with _storage_lock:
+        if _storage is not None:
+            _storage.close()
+            _storage = None
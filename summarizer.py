@@ -0,0 +1,71 @@
+# summarizer.py
+
+from context_window import estimate_tokens
+
+FOLD_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Rewrite the summary so it also covers the new messages. Keep names, decisions, "
+    "preferences and open questions; drop greetings and filler. Reply with the summary only."
+)
+
+MERGE_INSTRUCTIONS = (
+    "Combine these summaries of earlier conversations into one shorter summary. "
+    "Keep lasting facts about the user and their projects, decisions and open questions. "
+    "Reply with the summary only."
+)
+
+
+def format_turns(messages):
+    """Messages as 'role: content' lines."""
+    return "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+
+
+class Summarizer:
+    """
+    Folds conversation turns into rolling summaries and summaries into
+    higher-level ones.
+
+    complete(instructions, text) sends one request to a model and returns
+    its reply; any deterministic function will do in tests. Inputs longer
+    than max_input_tokens are folded in several passes, each carrying the
+    previous pass's summary of up to max_summary_tokens, so no request
+    outgrows the model's context.
+    """
+
+    def __init__(self, complete, max_input_tokens=3000, max_summary_tokens=256):
+        self.complete = complete
+        self.max_input_tokens = max_input_tokens
+        self.max_summary_tokens = max_summary_tokens
+
+    def _chunks(self, items, cost):
+        """Split items into runs that fit beside a carried-over summary."""
+        budget = self.max_input_tokens - self.max_summary_tokens
+        chunk, used = [], 0
+        for item in items:
+            size = cost(item)
+            if chunk and used + size > budget:
+                yield chunk
+                chunk, used = [], 0
+            chunk.append(item)
+            used += size
+        if chunk:
+            yield chunk
+
+    def fold(self, summary, messages):
+        """The summary updated with messages, oldest first; summary may be None."""
+        for chunk in self._chunks(messages, lambda msg: estimate_tokens(msg["content"])):
+            text = format_turns(chunk)
+            if summary:
+                text = f"Summary so far:\n{summary}\n\nNew messages:\n{text}"
+            summary = self.complete(FOLD_INSTRUCTIONS, text).strip()
+        return summary
+
+    def merge(self, summaries):
+        """One summary covering several, given oldest first."""
+        merged = None
+        for chunk in self._chunks(summaries, estimate_tokens):
+            if merged:
+                chunk = [merged] + chunk
+            text = "\n\n".join(f"Summary {i}:\n{summary}" for i, summary in enumerate(chunk, 1))
+            merged = self.complete(MERGE_INSTRUCTIONS, text).strip()
+        return merged
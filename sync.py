@@ -0,0 +1,201 @@
+# sync.py
+
+import time
+import random
+import subprocess
+import threading
+from datetime import datetime
+
+from metrics import span
+
+
+class GitSync:
+    """
+    Daemon thread that commits and pushes memory files to the git remote.
+
+    Dirty notifications are coalesced into at most one commit per interval;
+    failed pushes are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, paths, repo_dir=".", interval=30.0, base_backoff=2.0,
+                 max_backoff=300.0):
+        self.paths = list(paths)
+        self.repo_dir = repo_dir
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._message = None
+        self._push_pending = False
+        self._last_commit = float("-inf")
+        self._next_retry = 0.0
+        self._failures = 0
+        self._flush_requested = 0
+        self._flush_handled = 0
+        self._stopping = False
+        self._busy = False
+        self.commits = 0
+        self.pushes = 0
+        self.last_commit_time = None
+        self.last_push_time = None
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="git-sync", daemon=True)
+        self._thread.start()
+
+    def _git(self, *args):
+        """Run a git command in the repository, raising on failure."""
+        with span(f"git_{args[0]}"):
+            subprocess.run(["git", *args], cwd=self.repo_dir, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def mark_dirty(self, message=None):
+        """Note that memory changed; message overrides the next commit message."""
+        with self._cond:
+            self._dirty = True
+            if message:
+                self._message = message
+            self._cond.notify_all()
+
+    def _wait_time(self, now):
+        """Seconds until work is due, 0 if due now, None if there is none."""
+        waits = []
+        if self._dirty:
+            waits.append(self._last_commit + self.interval - now)
+        if self._push_pending:
+            waits.append(self._next_retry - now)
+        if not waits:
+            return None
+        return max(0.0, min(waits))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    flush = self._flush_requested
+                    if flush != self._flush_handled:
+                        break
+                    if self._stopping:
+                        return
+                    wait = self._wait_time(time.monotonic())
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                self._busy = True
+
+            self._sync_once(force=flush != self._flush_handled)
+
+            with self._cond:
+                self._busy = False
+                self._flush_handled = flush
+                self._cond.notify_all()
+
+    def _sync_once(self, force=False):
+        """Commit if dirty and due (or forced), then push if anything is unpushed."""
+        with self._cond:
+            now = time.monotonic()
+            commit = self._dirty and (force or now >= self._last_commit + self.interval)
+            push = self._push_pending and (force or commit or now >= self._next_retry)
+            message = self._message
+            if commit:
+                self._dirty = False
+                self._message = None
+
+        if commit:
+            try:
+                # A dirty mark that staged nothing has nothing to push
+                push = self._commit(message) or push
+            except Exception as e:
+                with self._cond:
+                    self._dirty = True
+                    self._message = self._message or message
+                    self.last_error = f"commit failed: {e}"
+                    self._last_commit = time.monotonic()
+                return
+
+        if push:
+            self._push()
+
+    def _commit(self, message):
+        """Commit the memory files if anything changed; True if it committed."""
+        self._git("add", *self.paths)
+
+        # Nothing staged means nothing to commit
+        with span("git_diff"):
+            staged = subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=self.repo_dir,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with self._cond:
+            self._last_commit = time.monotonic()
+        if staged.returncode == 0:
+            return False
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._git("commit", "-m", message or f"Update conversation - {timestamp}")
+        with self._cond:
+            self.commits += 1
+            self.last_commit_time = timestamp
+            self._push_pending = True
+        return True
+
+    def _push(self):
+        """Push, rebasing on the remote once if it moved; back off on failure."""
+        try:
+            try:
+                self._git("push")
+            except subprocess.CalledProcessError:
+                # The remote moved: replay our commits on it, setting aside
+                # uncommitted edits to the working tree, and push again
+                self._git("pull", "--rebase", "--autostash")
+                self._git("push")
+        except Exception as e:
+            with self._cond:
+                # Keep retrying until a push gets through
+                self._push_pending = True
+                self._failures += 1
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (self._failures - 1))
+                self._next_retry = time.monotonic() + delay * random.uniform(0.5, 1.0)
+                self.last_error = f"push failed: {e}"
+            return
+
+        with self._cond:
+            self._push_pending = False
+            self._failures = 0
+            self._next_retry = 0.0
+            self.pushes += 1
+            self.last_push_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.last_error = None
+
+    def flush(self, timeout=None):
+        """Commit and push now; True if everything reached the remote in time."""
+        with self._cond:
+            self._flush_requested += 1
+            target = self._flush_requested
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._flush_handled >= target, timeout)
+            return not self._dirty and not self._push_pending
+
+    def status(self):
+        """Snapshot of the sync state for display."""
+        with self._cond:
+            retry_in = None
+            if self._push_pending:
+                retry_in = max(0.0, self._next_retry - time.monotonic())
+            return {
+                "dirty": self._dirty,
+                "syncing": self._busy,
+                "push_pending": self._push_pending,
+                "failures": self._failures,
+                "retry_in": retry_in,
+                "commits": self.commits,
+                "pushes": self.pushes,
+                "last_commit": self.last_commit_time,
+                "last_push": self.last_push_time,
+                "last_error": self.last_error,
+            }
+
+    def stop(self, timeout=None):
+        """Stop the worker thread without syncing pending changes."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,27 @@
+# conftest.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def scratch_memory(tmp_path, monkeypatch):
+    """logic running on a fresh database in tmp_path, never pushing anywhere."""
+    import logic
+    from sync import GitSync
+
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    monkeypatch.chdir(tmp_path)
+    sync = GitSync([logic.SHARD_DIR], repo_dir=str(tmp_path), interval=3600)
+    for name, value in (("_sync", sync), ("_shards", None), ("_stores", None), ("_summarizer", None)):
+        monkeypatch.setattr(logic, name, value)
+    logic.init_db()
+    yield logic
+    logic.shutdown()
+    sync.stop(timeout=5)
@@ -0,0 +1,94 @@
+# test_context_window.py
+
+from types import SimpleNamespace
+
+from context_window import MESSAGE_OVERHEAD, build_context, estimate_tokens
+
+
+def history(count, words=50):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"turn {i} " + "word " * words}
+            for i in range(count)]
+
+
+def total(conversation):
+    return sum(estimate_tokens(msg["content"]) for msg in conversation)
+
+
+def test_estimate_counts_words_characters_and_framing():
+    assert estimate_tokens("") == MESSAGE_OVERHEAD
+    assert estimate_tokens("a b c d e") == 5 + MESSAGE_OVERHEAD
+    assert estimate_tokens("x" * 400) == 100 + MESSAGE_OVERHEAD
+
+
+def test_short_history_is_sent_whole():
+    turns = history(4)
+    conversation = build_context("system", turns, budget=6000)
+
+    assert conversation == [{"role": "system", "content": "system"}] + turns
+
+
+def test_long_history_keeps_recent_turns_within_budget():
+    turns = history(40)
+    facts = [{"content": f"fact {i}"} for i in range(3)]
+    conversation = build_context("system", turns, facts, budget=1000, summaries=["earlier"])
+
+    assert total(conversation) <= 1000
+    assert conversation[0] == {"role": "system", "content": "system"}
+    assert conversation[1]["content"] == "Summary of earlier conversation:\nearlier"
+    assert conversation[2]["content"] == "Known facts from earlier sessions:\n- fact 0\n- fact 1\n- fact 2"
+
+    note = conversation[3]
+    recent = conversation[4:]
+    assert 0 < len(recent) < 40 and recent == turns[-len(recent):]
+    dropped = turns[:-len(recent)]
+    assert note["content"].startswith(f"{len(dropped)} earlier messages were omitted.")
+    last_asked = max(i for i, msg in enumerate(dropped) if msg["role"] == "user")
+    assert f"\n- turn {last_asked} word" in note["content"]
+
+
+def test_output_depends_only_on_arguments():
+    turns = history(30)
+    facts = [{"content": "fact"}]
+    first = build_context("system", turns, facts, budget=800, summaries=["earlier"])
+
+    assert build_context("system", history(30), [{"content": "fact"}], budget=800,
+                         summaries=["earlier"]) == first
+    assert turns == history(30)
+
+
+def test_newest_turn_is_kept_even_over_budget():
+    turns = history(3, words=500)
+    conversation = build_context("system", turns, budget=100)
+
+    assert conversation[-1] == turns[-1]
+
+
+class RecordingClient:
+    """Fake chat client that keeps every request and replies with a counter."""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        message = SimpleNamespace(content=f"reply {len(self.requests)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_answer_sends_the_built_context(scratch_memory, monkeypatch):
+    logic = scratch_memory
+    client = RecordingClient()
+    monkeypatch.setattr(logic, "client", client, raising=False)
+    monkeypatch.setattr(logic, "SUMMARY_TRIGGER_TOKENS", 10 ** 9)
+
+    for i in range(30):
+        logic.answer(f"question {i} " + "word " * 300)
+
+    sent = client.requests[-1]["messages"]
+    asked = logic.get_history()[:-1]
+    assert sent == build_context(logic.SYSTEM_PROMPT, asked)
+    assert total(sent) <= logic.DEFAULT_TOKEN_BUDGET
+    assert sent[-1]["content"].startswith("question 29 ")
+    assert "earlier messages were omitted" in sent[1]["content"]
@@ -0,0 +1,25 @@
+# test_query_plans.py
+
+import sqlite3
+
+import pytest
+
+from setup_db import HOT_QUERIES, MIGRATIONS, check_query_plans, migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "context.db")
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def test_migrations_reach_latest_version(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(conn, name):
+    failures = dict(check_query_plans(conn))
+    assert name not in failures, f"{name}: {' / '.join(failures[name])}"
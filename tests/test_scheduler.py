@@ -0,0 +1,107 @@
+# test_scheduler.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bench import FakeAPIError, FakeGroqClient
+from scheduler import CircuitBreaker, CircuitOpenError, RateLimitedClient
+
+REQUEST = {"messages": [{"role": "user", "content": "hello"}], "max_tokens": 16}
+
+
+def spy(fake, before=None):
+    """Wrap fake's create so every call is timed and counted while in flight."""
+    create = fake.create
+    lock = threading.Lock()
+    calls = {"times": [], "active": 0, "peak": 0}
+
+    def wrapped(**kwargs):
+        with lock:
+            calls["times"].append(time.monotonic())
+            calls["active"] += 1
+            calls["peak"] = max(calls["peak"], calls["active"])
+        try:
+            if before is not None:
+                before()
+            return create(**kwargs)
+        finally:
+            with lock:
+                calls["active"] -= 1
+
+    fake.chat.completions.create = wrapped
+    return calls
+
+
+def scheduled(fake, **kwargs):
+    kwargs = {"rpm": 6000, "tpm": 600_000, "base_backoff": 0.001, **kwargs}
+    return RateLimitedClient(fake, **kwargs)
+
+
+def test_retry_waits_for_retry_after():
+    fake = FakeGroqClient(latency=0, error_rate=1.0, retry_after=0.3)
+    calls = spy(fake)
+    client = scheduled(fake, max_retries=1)
+
+    with pytest.raises(FakeAPIError):
+        client.chat.completions.create(**REQUEST)
+
+    first, second = calls["times"]
+    assert second - first >= 0.3
+    assert client.stats()["retries"] == 1
+
+
+def test_breaker_opens_after_threshold_and_closes_after_trial():
+    fake = FakeGroqClient(latency=0, error_rate=1.0, retry_after=None)
+    calls = spy(fake)
+    client = scheduled(fake, max_retries=0,
+                       breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+
+    for _ in range(2):
+        with pytest.raises(FakeAPIError):
+            client.chat.completions.create(**REQUEST)
+    with pytest.raises(CircuitOpenError):
+        client.chat.completions.create(**REQUEST)
+    assert client.breaker.state == "open"
+    assert len(calls["times"]) == 2
+
+    time.sleep(0.25)
+    fake.error_rate = 0.0
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "ok"
+    assert client.breaker.state == "closed"
+
+
+def test_interrupted_trial_does_not_wedge_breaker():
+    def interrupt():
+        raise KeyboardInterrupt
+
+    fake = FakeGroqClient(latency=0, error_rate=1.0, retry_after=None)
+    client = scheduled(fake, max_retries=0,
+                       breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+    with pytest.raises(FakeAPIError):
+        client.chat.completions.create(**REQUEST)
+
+    time.sleep(0.15)
+    spy(fake, before=interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        client.chat.completions.create(**REQUEST)
+
+    # The interrupted trial counts as a failure and the next one is allowed
+    time.sleep(0.15)
+    spy(fake)
+    fake.error_rate = 0.0
+    client.chat.completions.create(**REQUEST)
+    assert client.breaker.state == "closed"
+
+
+def test_concurrency_never_exceeds_limit():
+    fake = FakeGroqClient(latency=0.05, error_rate=0.3, retry_after=0.01)
+    calls = spy(fake)
+    client = scheduled(fake, max_concurrency=3, max_retries=10)
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        list(pool.map(lambda _: client.chat.completions.create(**REQUEST), range(24)))
+
+    assert calls["peak"] == 3
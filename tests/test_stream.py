@@ -0,0 +1,79 @@
+# test_stream.py
+
+from types import SimpleNamespace
+
+import pytest
+
+
+class StreamError(Exception):
+    pass
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class StreamingClient:
+    """Fake chat client streaming canned chunks, then raising if given an error."""
+
+    def __init__(self, parts, error=None):
+        self.parts = parts
+        self.error = error
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        return self._stream()
+
+    def _stream(self):
+        yield SimpleNamespace(choices=[])
+        for part in self.parts:
+            yield chunk(part)
+            yield chunk(None)
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def stream_with(scratch_memory, monkeypatch):
+    def use(parts, error=None):
+        monkeypatch.setattr(scratch_memory, "client", StreamingClient(parts, error), raising=False)
+        return scratch_memory
+    return use
+
+
+def stored(logic):
+    return [(msg["role"], msg["content"]) for msg in logic.get_history()]
+
+
+def test_stream_yields_chunks_and_stores_reply(stream_with):
+    logic = stream_with(["Hello", ", ", "world."])
+
+    assert list(logic.query_llama_stream("hi")) == ["Hello", ", ", "world."]
+    assert stored(logic) == [("user", "hi"), ("assistant", "Hello, world.")]
+
+
+def test_failed_stream_stores_partial_reply(stream_with):
+    logic = stream_with(["Hello", ", wor"], StreamError("connection reset"))
+
+    parts = list(logic.query_llama_stream("hi"))
+
+    assert parts == ["Hello", ", wor", "\nError: connection reset"]
+    assert stored(logic) == [("user", "hi"), ("assistant", "Hello, wor")]
+
+
+def test_stream_failing_before_any_chunk_stores_no_reply(stream_with):
+    logic = stream_with([], StreamError("unavailable"))
+
+    assert list(logic.query_llama_stream("hi")) == ["Error: unavailable"]
+    assert stored(logic) == [("user", "hi")]
+
+
+def test_closed_stream_stores_partial_reply(stream_with):
+    logic = stream_with(["Hello", ", ", "world."])
+
+    stream = logic.query_llama_stream("hi")
+    assert next(stream) == "Hello"
+    stream.close()
+
+    assert stored(logic) == [("user", "hi"), ("assistant", "Hello")]
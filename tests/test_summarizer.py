@@ -0,0 +1,122 @@
+# test_summarizer.py
+
+import json
+
+import pytest
+
+import logic
+from context_window import estimate_tokens
+from summarizer import FOLD_INSTRUCTIONS, MERGE_INSTRUCTIONS, Summarizer, format_turns
+
+
+class FakeModel:
+    """Deterministic complete(): numbered replies, every request kept."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, instructions, text):
+        self.requests.append((instructions, text))
+        kind = "fold" if instructions == FOLD_INSTRUCTIONS else "merge"
+        return f" {kind} {len(self.requests)} "
+
+
+def turns(count, words=20):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"message {i} " + "word " * words}
+            for i in range(count)]
+
+
+def test_fold_chunks_long_input_and_carries_the_summary():
+    model = FakeModel()
+    summarizer = Summarizer(model, max_input_tokens=200, max_summary_tokens=50)
+
+    assert summarizer.fold("earlier", turns(12)) == "fold 3"
+
+    assert len(model.requests) == 3
+    assert all(instructions == FOLD_INSTRUCTIONS for instructions, _ in model.requests)
+    assert all(estimate_tokens(text) <= 200 for _, text in model.requests)
+    assert model.requests[0][1].startswith("Summary so far:\nearlier\n")
+    assert model.requests[1][1].startswith("Summary so far:\nfold 1\n")
+    assert "message 11" in model.requests[2][1]
+
+
+def test_fold_without_summary_sends_turns_only():
+    model = FakeModel()
+    Summarizer(model).fold(None, turns(2))
+
+    assert model.requests == [(FOLD_INSTRUCTIONS, format_turns(turns(2)))]
+
+
+def test_merge_chunks_and_carries_the_merged_summary():
+    model = FakeModel()
+    summarizer = Summarizer(model, max_input_tokens=100, max_summary_tokens=20)
+    summaries = [f"summary {i} " + "word " * 20 for i in range(6)]
+
+    merged = summarizer.merge(summaries)
+
+    assert len(model.requests) > 1
+    assert merged == f"merge {len(model.requests)}"
+    assert all(instructions == MERGE_INSTRUCTIONS for instructions, _ in model.requests)
+    assert model.requests[1][1].startswith("Summary 1:\nmerge 1\n")
+
+
+@pytest.fixture
+def memory(scratch_memory, monkeypatch):
+    """Sessions in a scratch directory, folded by a FakeModel."""
+    model = FakeModel()
+    monkeypatch.setattr(logic, "_summarizer", Summarizer(model))
+    return model
+
+
+def add_turns(session_id, count):
+    ids = [logic.add_message(msg["role"], msg["content"], session_id=session_id)
+           for msg in turns(count)]
+    logic.flush_writes()
+    return ids
+
+
+def test_summarize_session_archives_and_tombstones_folded_turns(memory):
+    session_id = logic._session_id
+    ids = add_turns(session_id, 8)
+
+    assert logic.summarize_session(session_id, keep_recent=2) == 6
+
+    assert logic.session_summary(session_id) == "fold 1"
+    assert [msg["id"] for msg in logic.get_history(session_id)] == ids[6:]
+    archived = logic.session_archive().messages(session_id)
+    assert [msg["id"] for msg in archived] == ids[:6]
+
+    # The next fold updates the same summary in place
+    assert logic.summarize_session(session_id) == 2
+    assert logic.session_summary(session_id) == "fold 2"
+    assert "Summary so far:\nfold 1\n" in memory.requests[1][1]
+
+    logic.shutdown()
+    with open(logic.JOURNAL_PATH, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert {entry["id"] for entry in entries if entry.get("deleted")} == set(ids)
+    assert [entry["content"] for entry in entries if entry.get("role") == "summary"] == ["fold 1", "fold 2"]
+
+
+def test_short_session_without_summary_stays_verbatim(memory):
+    session_id = logic._session_id
+    add_turns(session_id, 2)
+
+    assert logic.summarize_session(session_id, min_tokens=10_000) == 0
+    assert memory.requests == []
+
+
+def test_merge_summaries_builds_a_level_per_fanout(memory):
+    for _ in range(4):
+        session_id = logic.start_session()
+        add_turns(session_id, 2)
+        logic.summarize_session(session_id)
+        logic._db().execute("UPDATE sessions SET end_time = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+
+    assert logic.merge_summaries(fanout=2) == 3
+
+    levels = dict(logic._db().query("SELECT level, COUNT(*) FROM summaries GROUP BY level"))
+    assert levels == {0: 4, 1: 2, 2: 1}
+    top = logic._db().query("SELECT content FROM summaries WHERE parent_id IS NULL")
+    assert top == [("merge 7",)]
@@ -0,0 +1,116 @@
+# test_sync.py
+
+import subprocess
+
+import pytest
+
+from sync import GitSync
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True,
+                          text=True).stdout
+
+
+def clone(remote, path):
+    subprocess.run(["git", "clone", "-q", str(remote), str(path)], check=True, capture_output=True)
+    git(path, "config", "user.name", "test")
+    git(path, "config", "user.email", "test@example.com")
+    git(path, "config", "commit.gpgsign", "false")
+    return path
+
+
+def append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def clones(tmp_path):
+    """Two clones of a local bare remote that holds a memory/ directory."""
+    remote = tmp_path / "remote.git"
+    subprocess.run(["git", "init", "-q", "--bare", str(remote)], check=True)
+    a = clone(remote, tmp_path / "a")
+    (a / "memory").mkdir()
+    (a / "memory" / ".gitattributes").write_text("manifest.jsonl merge=union\n")
+    (a / "memory" / "manifest.jsonl").write_text('{"shard": "base"}\n')
+    (a / "notes.txt").write_text("tracked\n")
+    git(a, "add", ".")
+    git(a, "commit", "-q", "-m", "initial")
+    git(a, "push", "-q", "-u", "origin", "HEAD")
+    b = clone(remote, tmp_path / "b")
+    return remote, a, b
+
+
+def sync_now(repo):
+    """Commit and push memory/ in repo through GitSync; the final status."""
+    sync = GitSync(["memory"], repo_dir=str(repo), interval=0)
+    try:
+        sync.mark_dirty("Update memory")
+        assert sync.flush(timeout=30)
+        return sync.status()
+    finally:
+        sync.stop(timeout=5)
+
+
+def remote_file(remote, path):
+    return git(remote, "show", f"HEAD:{path}")
+
+
+def test_push_rebases_when_remote_moved(clones):
+    remote, a, b = clones
+    append(b / "memory" / "manifest.jsonl", '{"shard": "from-b"}\n')
+    sync_now(b)
+
+    # a's push is rejected as non-fast-forward until it rebases on b's commit
+    append(a / "memory" / "manifest.jsonl", '{"shard": "from-a"}\n')
+    status = sync_now(a)
+
+    assert status["pushes"] == 1 and status["last_error"] is None
+    manifest = remote_file(remote, "memory/manifest.jsonl")
+    assert '"from-a"' in manifest and '"from-b"' in manifest
+
+
+def test_push_rebases_with_dirty_working_tree(clones):
+    remote, a, b = clones
+    append(b / "memory" / "manifest.jsonl", '{"shard": "from-b"}\n')
+    sync_now(b)
+
+    # Uncommitted edits outside memory/ and untracked files are normal here
+    append(a / "notes.txt", "edited locally\n")
+    (a / "scratch.txt").write_text("untracked\n")
+    append(a / "memory" / "manifest.jsonl", '{"shard": "from-a"}\n')
+    status = sync_now(a)
+
+    assert status["pushes"] == 1 and status["last_error"] is None
+    assert '"from-a"' in remote_file(remote, "memory/manifest.jsonl")
+    assert remote_file(remote, "notes.txt") == "tracked\n"
+    assert (a / "notes.txt").read_text() == "tracked\nedited locally\n"
+    assert (a / "scratch.txt").exists()
+
+
+def test_dirty_mark_without_changes_does_not_push(clones):
+    remote, a, b = clones
+    status = sync_now(a)
+
+    assert status["commits"] == 0 and status["pushes"] == 0
+    assert status["failures"] == 0 and status["last_error"] is None
+
+
+def test_failed_push_stays_pending(clones):
+    remote, a, b = clones
+    git(a, "remote", "set-url", "origin", str(remote.parent / "missing.git"))
+    append(a / "memory" / "manifest.jsonl", '{"shard": "from-a"}\n')
+
+    sync = GitSync(["memory"], repo_dir=str(a), interval=0)
+    try:
+        sync.mark_dirty("Update memory")
+        assert not sync.flush(timeout=30)
+        status = sync.status()
+    finally:
+        sync.stop(timeout=5)
+
+    assert status["commits"] == 1 and status["pushes"] == 0
+    assert status["push_pending"] and status["failures"] >= 1
+    assert status["retry_in"] is not None
+    assert status["last_error"].startswith("push failed")
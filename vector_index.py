@@ -0,0 +1,172 @@
+# vector_index.py
+
+import os
+import re
+import json
+import zlib
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+# Width of the hashed feature space
+DEFAULT_DIM = 1024
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words too common to say anything about relevance
+STOP_WORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "it",
+    "this", "that", "of", "in", "on", "at", "to", "for", "with", "by", "as", "do",
+    "does", "how", "what", "i", "you", "we", "they", "he", "she", "me", "my", "your",
+})
+
+
+@lru_cache(maxsize=65536)
+def _feature(token, dim):
+    """Column and sign of a token in the hashed feature space."""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+
+class HashingVectorizer:
+    """Offline text embedding: signed feature hashing of words and word pairs."""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def transform(self, texts):
+        """L2-normalized float32 vectors, one row per text."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [w for w in _TOKEN.findall(text.lower()) if w not in STOP_WORDS]
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for token in features:
+                column, sign = _feature(token, self.dim)
+                matrix[row, column] += sign
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class VectorIndex:
+    """Growable float32 matrix of message embeddings with top-k cosine search."""
+
+    def __init__(self, path, dim=DEFAULT_DIM):
+        self.path = path
+        self.vectorizer = HashingVectorizer(dim)
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, msg_id):
+        return msg_id in self._rows
+
+    def ids(self):
+        """Ids of every indexed message."""
+        with self._lock:
+            return list(self._ids)
+
+    def _reserve(self, size):
+        """Grow the matrix geometrically so appends stay amortized O(1)."""
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        grown = np.zeros((max(size, capacity * 2, 64), self.vectorizer.dim), dtype=np.float32)
+        grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = grown
+
+    def add(self, ids, texts):
+        """Index (or re-index) messages in one batch."""
+        if not ids:
+            return
+        vectors = self.vectorizer.transform(texts)
+        with self._lock:
+            self._reserve(len(self._ids) + len(ids))
+            for msg_id, vector in zip(ids, vectors):
+                row = self._rows.get(msg_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(msg_id)
+                    self._rows[msg_id] = row
+                self._matrix[row] = vector
+            self._dirty = True
+
+    def remove(self, msg_id):
+        """Drop a message by moving the last row into its slot."""
+        with self._lock:
+            row = self._rows.pop(msg_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+                self._matrix[row] = self._matrix[last]
+            self._ids.pop()
+            self._dirty = True
+            return True
+
+    def clear(self):
+        """Remove every message from the index."""
+        with self._lock:
+            self._ids = []
+            self._rows = {}
+            self._matrix = np.zeros((0, self.vectorizer.dim), dtype=np.float32)
+            self._dirty = True
+
+    def search(self, query, k):
+        """The k most similar messages as (id, score), best first."""
+        query_vector = self.vectorizer.transform([query])[0]
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or k <= 0:
+                return []
+            scores = self._matrix[:size] @ query_vector
+            if k < size:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(size)
+            # Stable order: score descending, then row for equal scores
+            top = top[np.lexsort((top, -scores[top]))]
+            return [(self._ids[row], float(scores[row])) for row in top]
+
+    def load(self):
+        """Load the index saved next to the database; False if there is none."""
+        try:
+            matrix = np.load(f"{self.path}.npy")
+            with open(f"{self.path}.ids.json", "r", encoding="utf-8") as f:
+                ids = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if matrix.shape != (len(ids), self.vectorizer.dim):
+            return False
+
+        with self._lock:
+            self._ids = ids
+            self._rows = {msg_id: row for row, msg_id in enumerate(ids)}
+            self._matrix = matrix.astype(np.float32, copy=False)
+            self._dirty = False
+        return True
+
+    def save(self):
+        """Write the index next to the database if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            matrix = self._matrix[:len(self._ids)].copy()
+            ids = list(self._ids)
+            self._dirty = False
+
+        with open(f"{self.path}.tmp.npy", "wb") as f:
+            np.save(f, matrix)
+        with open(f"{self.path}.ids.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        os.replace(f"{self.path}.tmp.npy", f"{self.path}.npy")
+        os.replace(f"{self.path}.ids.json.tmp", f"{self.path}.ids.json")